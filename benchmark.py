@@ -0,0 +1,566 @@
+"""Modern Pomodoro のパフォーマンス計測スクリプト
+
+Linux でもGUIなしで動くように、winsound / winotify はここで用意する代用モジュールに差し替え、
+ディスプレイがない (または --stub-gui 指定の) 場合は customtkinter も描画しない代用品にする。
+結果はJSONで出力し、--compare で以前の結果と比べられる。
+
+    python benchmark.py                       # 標準セット
+    python benchmark.py --full                # export_csv の 10M 行も含める
+    python benchmark.py --only noise,timer -o result.json
+    python benchmark.py --compare old.json -o new.json
+    python benchmark.py --generate work_log.db --years 5   # 計測用DBを作るだけ
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+
+# --- 代用モジュール ---
+class Anything:
+    """どんな属性参照・呼び出しにも自分を返す"""
+    def __call__(self, *args, **kwargs): return self
+    def __getattr__(self, name): return self
+
+class FakeWidget:
+    """customtkinter のウィジェットの代わり。configure の回数だけ数える"""
+    configure_calls = 0
+
+    def __init__(self, *args, **kwargs):
+        self.options = dict(kwargs)
+        self.mapped = False
+
+    def configure(self, **kwargs):
+        FakeWidget.configure_calls += 1
+        self.options.update(kwargs)
+
+    def cget(self, key):
+        return self.options.get(key)
+
+    def pack(self, *args, **kwargs): self.mapped = True
+    def grid(self, *args, **kwargs): self.mapped = True
+    def pack_forget(self): self.mapped = False
+    def grid_remove(self): self.mapped = False
+    def winfo_ismapped(self): return self.mapped
+    def after_idle(self, func, *args): func(*args)
+    def after(self, ms, func=None, *args): return None
+    def get(self): return self.options.get("value", "")
+    def set(self, *args): pass
+
+    def winfo_screenwidth(self): return 1920
+    def winfo_screenheight(self): return 1080
+    def winfo_x(self): return 0
+    def winfo_y(self): return 0
+    def winfo_children(self): return []
+
+    def __getattr__(self, name):
+        # それ以外の属性・メソッドは何もしない
+        return Anything()
+
+def fake_customtkinter():
+    ctk = types.ModuleType("customtkinter")
+    ctk.set_appearance_mode = lambda mode: None
+    ctk.set_default_color_theme = lambda theme: None
+    for name in ["CTk", "CTkFrame", "CTkLabel", "CTkButton", "CTkScrollbar", "CTkEntry", "CTkTabview",
+                 "CTkSegmentedButton", "CTkOptionMenu", "CTkSlider", "CTkSwitch", "CTkScrollableFrame",
+                 "CTkToplevel", "CTkTextbox", "StringVar"]:
+        setattr(ctk, name, type(name, (FakeWidget,), {}))
+    return ctk
+
+def install_fakes(stub_gui):
+    """Windows専用モジュールと (必要なら) GUI を代用品に差し替える"""
+    if importlib.util.find_spec("winsound") is None:
+        winsound = types.ModuleType("winsound")
+        winsound.Beep = lambda frequency, duration: None
+        winsound.PlaySound = lambda sound, flags: None
+        winsound.SND_MEMORY = winsound.SND_NODEFAULT = winsound.SND_PURGE = 0
+        sys.modules["winsound"] = winsound
+    if importlib.util.find_spec("winotify") is None:
+        winotify = types.ModuleType("winotify")
+        class Notification:
+            def __init__(self, **kwargs): pass
+            def show(self): pass
+        winotify.Notification = Notification
+        winotify.audio = types.SimpleNamespace(Default=None)
+        sys.modules["winotify"] = winotify
+    if importlib.util.find_spec("pygame") is None:
+        pygame = types.ModuleType("pygame")
+        pygame.mixer = types.SimpleNamespace(init=lambda *a, **k: None, music=FakeWidget(), set_reserved=lambda n: n,
+                                             Channel=FakeWidget, Sound=FakeWidget, get_init=lambda: (44100, -16, 2))
+        sys.modules["pygame"] = pygame
+    if stub_gui or importlib.util.find_spec("customtkinter") is None:
+        sys.modules["customtkinter"] = fake_customtkinter()
+        return True
+    return False
+
+# --- 計測用データ生成 ---
+TASKS = ["英語の勉強", "資料作成", "メール返信", "コードレビュー", "読書", "設計", "議事録", "経費精算",
+         "テスト作成", "リファクタリング", "数学の勉強", "企画書", "調査", "ブログ執筆", "家計簿"]
+
+def generate_workload(path, years=3, rows=None, seed=0, end=datetime.date(2026, 1, 1)):
+    """数年分の作業履歴を決まった乱数で work_log.db 形式のDBに書き込む
+
+    平日は多め・週末は少なめ、タスクは偏りのある分布、時刻は 8:00-22:00 の範囲。
+    rows を指定するとその件数に達するまで (必要なら years を超えて) 過去へさかのぼる。
+    """
+    import pomodoro
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(TASKS))]
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    pomodoro.SchemaMigrations.apply(conn)
+    days = years * 365
+    # 件数指定のときは1日あたりの件数を増やして日数が膨らみすぎないようにする (1日の平均は約4件)
+    scale = 1 if rows is None else max(1, rows // (days * 4))
+    # 先に end から過去へ1日ずつ件数を決める (件数指定なら rows に達するまで。最古の日で端数を調整)
+    counts = []
+    total = 0
+    day = end
+    while (len(counts) < days) if rows is None else (total < rows):
+        day -= datetime.timedelta(days=1)
+        n = rng.choice([0, 2, 4, 6, 8, 10] if day.weekday() < 5 else [0, 0, 1, 2, 4]) * scale
+        counts.append(n)
+        total += n
+    counts.reverse()
+    if rows is not None and counts: counts[0] -= total - rows
+    total = 0
+    batch = []
+    conn.execute("BEGIN")
+    # 検索索引は1行ずつ更新せず最後にまとめて作る
+    with pomodoro.TaskSearch.triggers_suspended(conn, names=["logs_fts_insert"]):
+        for n in counts:
+            clock = datetime.datetime.combine(day, datetime.time(8)) + datetime.timedelta(minutes=rng.randrange(0, 120))
+            for _ in range(n):
+                minutes = 25 if rng.random() < 0.8 else 50
+                start = clock
+                end_dt = start + datetime.timedelta(minutes=minutes)
+                task = rng.choices(TASKS, weights)[0]
+                batch.append((int(start.timestamp()), int(end_dt.timestamp()), minutes, task,
+                              end_dt.strftime("%Y-%m-%d"), f"{start:%H:%M} - {end_dt:%H:%M}"))
+                clock = end_dt + datetime.timedelta(minutes=rng.choice([5, 5, 10, 15, 30]))
+                if clock.date() != day: clock = datetime.datetime.combine(day, datetime.time(8))
+                total += 1
+            if len(batch) >= 10000:
+                conn.executemany("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+            day += datetime.timedelta(days=1)
+        if batch:
+            conn.executemany("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("COMMIT")
+    conn.close()
+    return total
+
+# --- 計測 ---
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux では KiB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_noise(ctx):
+    """アプリと同じ NoiseCache.ensure (ループ用クロスフェード込み) で、初回生成とキャッシュ確認を測る"""
+    import pomodoro
+    results = []
+    cwd = os.getcwd()
+    workdir = os.path.join(ctx.tmp, "noise")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)  # NoiseCache はカレントディレクトリに WAV を置く
+    try:
+        cache = pomodoro.NoiseCache()
+        for color in ["white", "pink", "brown"]:
+            params = {"color": color, "duration": pomodoro.NOISE_DURATION, "loop_fade": pomodoro.NOISE_LOOP_FADE}
+            seconds, _ = timed(cache.ensure, color)
+            results.append({"name": "generate_noise_file", "params": params, "seconds": seconds})
+            seconds, _ = timed(cache.ensure, color)
+            results.append({"name": "noise_cache_hit", "params": params, "seconds": seconds})
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def bench_insert(ctx, count=10000):
+    import pomodoro
+    path = os.path.join(ctx.tmp, "insert.db")
+    store = pomodoro.LogStore(path)
+    now = int(time.time())
+    start = time.perf_counter()
+    futures = [store.insert_log(now + i * 1800, now + i * 1800 + 1500, 25, TASKS[i % len(TASKS)]) for i in range(count)]
+    for f in futures: f.result()
+    seconds = time.perf_counter() - start
+    store.close()
+    return [{"name": "save_log", "params": {"rows": count}, "seconds": seconds, "rows_per_sec": count / seconds}]
+
+def bench_history(ctx, sizes=(50, 1000, 100000)):
+    import pomodoro
+    results = []
+    for size in sizes:
+        path = os.path.join(ctx.tmp, f"history_{size}.db")
+        generate_workload(path, rows=size, seed=size)
+        conn = sqlite3.connect(path)
+        def loader(before_id, offset, limit, callback):
+            callback(conn.execute(f"SELECT {pomodoro.LOG_COLUMNS} FROM logs WHERE id < ? ORDER BY id DESC LIMIT ? OFFSET ?", (before_id, limit, offset)).fetchall())
+        def counter(callback):
+            callback(conn.execute("SELECT COUNT(*), MAX(id) FROM logs").fetchone())
+        model = pomodoro.HistoryModel(loader, counter)
+        view = pomodoro.HistoryView(ctx.root, model)
+        first_render, _ = timed(view.reset)
+        if not ctx.stub_gui: view.render()
+        # 先頭から順にスクロールした後、ランダムな位置へ飛ぶ
+        rng = random.Random(size)
+        positions = list(range(0, min(size, 300), 3)) + [rng.randrange(size) for _ in range(100)]
+        start = time.perf_counter()
+        for pos in positions:
+            view.scroll_to(pos)
+            view.render()
+        scroll = time.perf_counter() - start
+        results.append({"name": "load_history", "params": {"rows": size}, "seconds": first_render,
+                        "scroll_ms_per_step": scroll * 1000 / len(positions), "cached_pages": len(model.pages)})
+        conn.close()
+    return results
+
+def bench_export(ctx, sizes):
+    import pomodoro
+    results = []
+    for size in sizes:
+        path = os.path.join(ctx.tmp, f"export_{size}.db")
+        generate_workload(path, rows=size, seed=size)
+        conn = sqlite3.connect(path, isolation_level=None)
+        export_dir = os.path.join(ctx.tmp, f"exports_{size}")
+        rss_before = peak_rss_mb()
+        seconds, count = timed(pomodoro.CsvExporter(export_dir).run, conn)
+        rss_after = peak_rss_mb()
+        conn.close()
+        results.append({"name": "export_csv", "params": {"rows": size}, "seconds": seconds, "rows_per_sec": count / seconds,
+                        "peak_rss_growth_mb": None if rss_before is None else rss_after - rss_before})
+        shutil.rmtree(export_dir, ignore_errors=True)
+        os.remove(path)
+    return results
+
+def bench_timer(ctx, minutes=50, jitter=0.05, seed=0):
+    """タイマーの締切に対し、ランダムに遅れる after() で1セッション回したときのずれ"""
+    import pomodoro
+    now = [0.0]
+    rng = random.Random(seed)
+    engine = pomodoro.TimerEngine(minutes * 60, clock=lambda: now[0])
+    engine.start()
+    wakeups = 0
+    max_display_error = 0.0
+    while not engine.finished():
+        now[0] += (int(engine.next_boundary() * 1000) + 1) / 1000 + rng.uniform(0, jitter)
+        wakeups += 1
+        # 表示値と本当の残り時間の差 (切り上げ表示なので 0-1 秒が正常)
+        max_display_error = max(max_display_error, engine.remaining_display() - (minutes * 60 - now[0]))
+    return [{"name": "timer_drift", "params": {"minutes": minutes, "jitter_s": jitter},
+             "finish_lateness_ms": (now[0] - minutes * 60) * 1000, "wakeups": wakeups,
+             "max_display_error_s": max_display_error}]
+
+def bench_service(ctx, timers=10000, spread=5.0, seed=0):
+    """サービスで多数のタイマーを同時に動かし、起床回数と完了の遅れを測る (HTTPは通さない)"""
+    import asyncio
+    import pomodoro
+    store = pomodoro.LogStore(os.path.join(ctx.tmp, "service.db"))
+    service = pomodoro.TimerService(store)
+    rng = random.Random(seed)
+
+    async def scenario():
+        runner = asyncio.ensure_future(service.run())
+        await asyncio.sleep(0)
+        for i in range(timers):
+            timer_id = f"desk-{i}"
+            service.start(timer_id, minutes=1, task=TASKS[i % len(TASKS)])
+            # 1分待たずに済むよう、締切を 0-spread 秒後に詰める
+            timer = service.timers[timer_id]
+            timer.engine.deadline = service.clock() + rng.uniform(0.1, spread)
+            timer.generation += 1
+            service.push(timer)
+        service.wakeups = 0
+        start = time.perf_counter()
+        while service.completed < timers:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        runner.cancel()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    store.close()
+    stats = service.stats()
+    return [{"name": "timer_service", "params": {"timers": timers, "spread_s": spread}, "seconds": elapsed,
+             "wakeups": service.wakeups, "wakeups_per_sec": service.wakeups / elapsed,
+             "lateness_p50_ms": stats["lateness_p50_ms"], "lateness_p99_ms": stats["lateness_p99_ms"]}]
+
+def bench_drag(ctx, rate_hz=1000, seconds=1.0):
+    """バーモードのドラッグで、マウス移動 rate_hz 回/秒のとき geometry が何回呼ばれるか"""
+    import pomodoro
+    class Window:
+        def __init__(self):
+            self.now_ms = 0.0
+            self.timers = []
+            self.geometry_calls = 0
+        def after(self, ms, func): self.timers.append((self.now_ms + ms, func)); return len(self.timers)
+        def after_cancel(self, after_id): self.timers.clear()
+        def advance(self, ms):
+            self.now_ms += ms
+            due = [t for t in self.timers if t[0] <= self.now_ms]
+            self.timers = [t for t in self.timers if t[0] > self.now_ms]
+            for _, func in due: func()
+        def geometry(self, spec): self.geometry_calls += 1
+        def winfo_x(self): return 500
+        def winfo_y(self): return 500
+        def winfo_width(self): return 400
+        def winfo_height(self): return 40
+        def winfo_screenwidth(self): return 1920
+        def winfo_screenheight(self): return 1080
+    def event(i): return types.SimpleNamespace(x=i % 50, y=0, x_root=600 + i // 10, y_root=500)
+
+    events = int(rate_hz * seconds)
+    window = Window()
+    drag = pomodoro.DragController(window)
+    start = time.perf_counter()
+    drag.start(event(0))
+    for i in range(1, events + 1):
+        window.advance(1000 / rate_hz)
+        drag.move(event(i))
+    window.advance(drag.FRAME_MS)
+    drag.release(event(events))
+    elapsed = time.perf_counter() - start
+    # 以前の実装は移動イベントごとに geometry を呼んでいた
+    return [{"name": "bar_drag", "params": {"rate_hz": rate_hz, "seconds": seconds}, "seconds": elapsed,
+             "events": events, "geometry_calls_before": events, "geometry_calls": window.geometry_calls,
+             "geometry_per_second": window.geometry_calls / seconds}]
+
+def bench_bgm(ctx, switches=50):
+    """BGM切り替えの遅延。以前の music.load() + play() と、BgmEngine のクロスフェード切り替えを比べる
+
+    ミキサーは SDL のダミー音声ドライバで動かす (本物の pygame がない環境では測らない)。
+    """
+    import pomodoro
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame = pomodoro.pygame
+    if not hasattr(pygame.mixer, "get_busy"): return []
+    pygame.mixer.init()
+    pygame.mixer.set_reserved(3)
+    files = []
+    for color in ["white", "pink", "brown"]:
+        path = os.path.join(ctx.tmp, f"{color}_noise.wav")
+        pomodoro.NoiseSynth(color, seed=0).write_wav(path, pomodoro.NOISE_DURATION, loop_fade=pomodoro.NOISE_LOOP_FADE)
+        files.append(path)
+
+    def old_switch(i):
+        pygame.mixer.music.stop()
+        pygame.mixer.music.load(files[i % 3])
+        pygame.mixer.music.play(-1)
+    old_times = [timed(old_switch, i)[0] for i in range(switches)]
+    pygame.mixer.music.stop()
+
+    library = pomodoro.SoundLibrary(root=ctx.tmp)
+    sounds = [library.load(path) for path in files]
+    now = [0.0]
+    pending = []
+    engine = pomodoro.BgmEngine([pygame.mixer.Channel(1), pygame.mixer.Channel(2)],
+                                after=lambda ms, func: pending.append(func), clock=lambda: now[0])
+    new_times, steps = [], 0
+    for i in range(switches):
+        new_times.append(timed(engine.play, sounds[i % 3])[0])
+        # 次の切り替えまでにフェードを最後まで進める
+        while pending:
+            now[0] += engine.STEP_MS / 1000
+            pending.pop()()
+            steps += 1
+    assert engine.channels[engine.active].get_busy()
+    engine.stop()
+    pygame.mixer.quit()
+
+    def ms(times): return {"mean_ms": sum(times) / len(times) * 1000, "max_ms": max(times) * 1000}
+    return [{"name": "bgm_switch_reload", "params": {"switches": switches}, "seconds": sum(old_times), **ms(old_times)},
+            {"name": "bgm_switch_crossfade", "params": {"switches": switches}, "seconds": sum(new_times), **ms(new_times),
+             "fade_ms": engine.FADE_MS, "fade_steps_per_switch": steps / switches}]
+
+def bench_search(ctx, rows=1_000_000, queries=("の勉強", "勉強", "リファクタ", "英語 勉強", "見つからない語")):
+    """タスク名検索 (1ページ目 + 件数) と入力補完、エクスポート時の一括削除を測る"""
+    import pomodoro
+    path = os.path.join(ctx.tmp, f"search_{rows}.db")
+    generate_workload(path, rows=rows, seed=rows)
+    conn = sqlite3.connect(path, isolation_level=None)
+    pomodoro.StatsRollup.backfill(conn)
+    results = []
+    for text in queries:
+        def first_page():
+            count, max_id = pomodoro.TaskSearch.count(conn, text)
+            return count, (max_id or 0) + 1, pomodoro.TaskSearch.page(conn, text, (max_id or 0) + 1, 0, 100)
+        seconds, (count, top_id, page) = timed(first_page)
+        # 次のページ (関連度順なので OFFSET) も測る
+        deep = timed(pomodoro.TaskSearch.page, conn, text, top_id, 100, 100)[0] if page else 0.0
+        results.append({"name": "task_search", "params": {"rows": rows, "query": text}, "seconds": seconds,
+                        "matches": count, "next_page_ms": deep * 1000, "fts": pomodoro.TaskSearch.match_expr(conn, text) is not None})
+
+    completer = pomodoro.TaskCompleter()
+    load = timed(lambda: completer.load(pomodoro.TaskCompleter.recent_counts(conn, today=datetime.date(2026, 1, 1))))[0]
+    start = time.perf_counter()
+    for name in TASKS * 100:
+        for i in range(1, len(name) + 1): completer.complete(name[:i])
+    keystrokes = sum(len(name) for name in TASKS) * 100
+    results.append({"name": "task_autocomplete", "params": {"rows": rows}, "seconds": load,
+                    "names": len(completer.names), "us_per_keystroke": (time.perf_counter() - start) * 1e6 / keystrokes})
+
+    # export_csv と同じ一括削除 (削除トリガーあり / 外して作り直し)。どちらも最後に ROLLBACK する
+    for suspended in (False, True):
+        conn.execute("BEGIN IMMEDIATE")
+        start = time.perf_counter()
+        if suspended:
+            with pomodoro.TaskSearch.triggers_suspended(conn): conn.execute("DELETE FROM logs")
+        else:
+            conn.execute("DELETE FROM logs")
+        seconds = time.perf_counter() - start
+        conn.execute("ROLLBACK")
+        results.append({"name": "export_bulk_delete", "params": {"rows": rows, "triggers_suspended": suspended}, "seconds": seconds})
+    conn.close()
+    os.remove(path)
+    return results
+
+def bench_diag(ctx, calls=200_000):
+    """--diag の計測ラッパーのコスト。無効時は包まないので素の呼び出しと同じになる"""
+    import pomodoro
+    results = []
+    for enabled in (False, True):
+        diag = pomodoro.Diagnostics(enabled)
+        engine = pomodoro.TimerEngine(25 * 60)
+        engine.start()
+        diag.instrument(engine, ["remaining_display"], "bench")
+        start = time.perf_counter()
+        for _ in range(calls): engine.remaining_display()
+        seconds = time.perf_counter() - start
+        results.append({"name": "diag_overhead", "params": {"enabled": enabled, "calls": calls}, "seconds": seconds,
+                        "ns_per_call": seconds * 1e9 / calls, "recorded": diag.snapshot()["metrics"].get("bench.remaining_display", {}).get("count", 0)})
+    return results
+
+def bench_import(ctx, years=10):
+    """years 年分の日別CSVを (CSV出力で空になった) DBへ取り込み直す。複数コアがあればプロセスプールとも比べる"""
+    import pomodoro
+    path = os.path.join(ctx.tmp, "import.db")
+    export_dir = os.path.join(ctx.tmp, "exports_import")
+    generate_workload(path, years=years, seed=years)
+    conn = sqlite3.connect(path, isolation_level=None)
+    pomodoro.StatsRollup.backfill(conn)
+    rows = pomodoro.CsvExporter(export_dir).run(conn)
+    # 壊れた行を1つ混ぜておく
+    with open(os.path.join(export_dir, sorted(os.listdir(export_dir))[0]), "a", encoding="utf-8") as f: f.write("x,2020-01-01,25\n")
+    conn.close()
+    store = pomodoro.LogStore(path)
+    results = []
+    for workers in sorted({1, min(4, os.cpu_count() or 1)}):
+        store.write(lambda conn: conn.execute("DELETE FROM logs")).result()
+        importer = pomodoro.CsvImporter(export_dir, workers=workers)
+        importer.POOL_MIN_FILES = 1
+        rss_before = peak_rss_mb()
+        seconds, summary = timed(importer.run, store)
+        rss_after = peak_rss_mb()
+        again = importer.run(store)
+        results.append({"name": "import_csv", "params": {"years": years, "workers": workers}, "seconds": seconds,
+                        "files": summary["files"], "rows": rows, "rows_per_sec": summary["inserted"] / seconds,
+                        "inserted": summary["inserted"], "skipped": summary["skipped"], "malformed": summary["malformed"],
+                        "reimport_skipped": again["skipped"],
+                        "peak_rss_growth_mb": None if rss_before is None else rss_after - rss_before})
+    store.close()
+    shutil.rmtree(export_dir, ignore_errors=True)
+    os.remove(path)
+    return results
+
+BENCHMARKS = {
+    "noise": lambda ctx: bench_noise(ctx),
+    "insert": lambda ctx: bench_insert(ctx),
+    "history": lambda ctx: bench_history(ctx),
+    "export": lambda ctx: bench_export(ctx, ctx.export_sizes),
+    "timer": lambda ctx: bench_timer(ctx),
+    "service": lambda ctx: bench_service(ctx),
+    "drag": lambda ctx: bench_drag(ctx),
+    "bgm": lambda ctx: bench_bgm(ctx),
+    "search": lambda ctx: bench_search(ctx),
+    "diag": lambda ctx: bench_diag(ctx),
+    "import": lambda ctx: bench_import(ctx),
+}
+
+def compare(old, new):
+    """同じ name/params の結果どうしで seconds の比を表示する"""
+    def key(r): return (r["name"], json.dumps(r.get("params", {}), sort_keys=True))
+    before = {key(r): r for r in old["results"]}
+    for r in new["results"]:
+        o = before.get(key(r))
+        if not o or "seconds" not in r or "seconds" not in o: continue
+        ratio = r["seconds"] / o["seconds"] if o["seconds"] else float("inf")
+        mark = "  <-- 遅くなっています" if ratio > 1.2 else ""
+        print(f"{r['name']:<22} {json.dumps(r.get('params', {}), ensure_ascii=False):<32} {o['seconds']:.4f}s -> {r['seconds']:.4f}s (x{ratio:.2f}){mark}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modern Pomodoro benchmark")
+    parser.add_argument("--only", help="カンマ区切りで実行する計測を選ぶ (" + ",".join(BENCHMARKS) + ")")
+    parser.add_argument("--full", action="store_true", help="export_csv の 10M 行も計測する")
+    parser.add_argument("--stub-gui", action="store_true", help="ディスプレイがあっても customtkinter を代用品にする")
+    parser.add_argument("-o", "--output", help="結果JSONの保存先 (省略時は標準出力)")
+    parser.add_argument("--compare", help="以前の結果JSONと比較する")
+    parser.add_argument("--generate", metavar="DB", help="計測用の履歴DBを作って終了する")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    no_display = sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+    stub_gui = install_fakes(args.stub_gui or no_display)
+
+    if args.generate:
+        count = generate_workload(args.generate, years=args.years, seed=args.seed)
+        print(f"{count} rows -> {args.generate}", file=sys.stderr)
+        return
+
+    import pomodoro
+    ctx = types.SimpleNamespace(tmp=tempfile.mkdtemp(prefix="pomodoro-bench-"), stub_gui=stub_gui,
+                                export_sizes=[10_000, 1_000_000] + ([10_000_000] if args.full else []))
+    if stub_gui:
+        ctx.root = FakeWidget()
+    else:
+        ctx.root = pomodoro.ctk.CTk()
+        ctx.root.withdraw()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    results = []
+    try:
+        for name in names:
+            print(f"running {name}...", file=sys.stderr)
+            results.extend(BENCHMARKS[name](ctx))
+    finally:
+        shutil.rmtree(ctx.tmp, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "stub_gui": stub_gui,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
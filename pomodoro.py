@@ -1,25 +1,2201 @@
-import customtkinter as ctk
-import sqlite3
-import datetime
-import winsound
-import threading
-import time
-import csv
 import os
-import random
-import struct
-import wave
-import pygame
-import ctypes
-from winotify import Notification, audio
+import sys
+import time
+import json
+import importlib
+from contextlib import contextmanager
+
+# --- 起動トレース ---
+class StartupTracer:
+    """import と初期化の各段階の経過時間・CPU時間を記録する
+
+    環境変数 POMODORO_TRACE_STARTUP=1 か --trace-startup で有効になり、
+    最初のフレームが出た時点で startup_trace.json に書き出す。無効時は何もしない。
+    """
+
+    def __init__(self, enabled, path="startup_trace.json"):
+        self.enabled = enabled
+        self.path = path
+        self.origin = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                "phase": name,
+                "start_ms": (wall - self.origin) * 1000,
+                "wall_ms": (time.perf_counter() - wall) * 1000,
+                "cpu_ms": (time.process_time() - cpu) * 1000,
+            })
+
+    def mark(self, name):
+        if self.enabled:
+            self.phases.append({"phase": name, "start_ms": (time.perf_counter() - self.origin) * 1000, "wall_ms": 0.0, "cpu_ms": 0.0})
+
+    def report(self):
+        if not self.enabled: return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"phases": self.phases}, f, ensure_ascii=False, indent=1)
+        if sys.stderr is None: return  # pythonw
+        for p in self.phases:
+            print(f"{p['start_ms']:9.1f}ms  {p['wall_ms']:8.1f}ms wall  {p['cpu_ms']:8.1f}ms cpu  {p['phase']}", file=sys.stderr)
+
+TRACE = StartupTracer(os.environ.get("POMODORO_TRACE_STARTUP") == "1" or "--trace-startup" in sys.argv)
+
+class LazyModule:
+    """最初に属性を参照したときに import するモジュールの代わり (特定の機能でしか使わない重いモジュール用)"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with TRACE.phase(f"import {self._name} (lazy)"):
+                self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+if __name__ == "__mp_main__":
+    # CSV取り込みのプロセスプール (spawn) の子はこのファイルを __mp_main__ として読み直す。
+    # 子では解析しかしないので、重い customtkinter の代わりに土台だけ用意する
+    import types
+    ctk = types.SimpleNamespace(CTk=object, CTkFrame=object, set_appearance_mode=lambda mode: None, set_default_color_theme=lambda theme: None)
+else:
+    with TRACE.phase("import customtkinter"):
+        import customtkinter as ctk
+with TRACE.phase("import stdlib"):
+    import sqlite3
+    import datetime
+    import threading
+    import math
+    import hashlib
+    import queue
+    import bisect
+    from collections import OrderedDict, deque
+    from concurrent.futures import ThreadPoolExecutor, Future
+
+# BGM・エクスポート・ノイズ生成・通知でしか使わないものは初回使用時に読み込む
+pygame = LazyModule("pygame")
+np = LazyModule("numpy")
+wave = LazyModule("wave")
+csv = LazyModule("csv")
+gzip = LazyModule("gzip")
+winsound = LazyModule("winsound")
+winotify = LazyModule("winotify")
+ctypes = LazyModule("ctypes")
+asyncio = LazyModule("asyncio")
+heapq = LazyModule("heapq")
+urllib_request = LazyModule("urllib.request")
+subprocess = LazyModule("subprocess")
+shutil = LazyModule("shutil")
+io = LazyModule("io")
+
+# --- 実行時計測 ---
+class LatencyHistogram:
+    """固定サイズの対数ヒストグラム (10µs から 2^(1/4) 倍刻みで約10秒まで。超えた分は最後のバケット)"""
+    BASE = 10e-6
+    STEPS_PER_OCTAVE = 4
+    BUCKETS = 80
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = int(math.log2(seconds / self.BASE) * self.STEPS_PER_OCTAVE) + 1 if seconds > self.BASE else 0
+        self.counts[min(index, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+
+    def percentile(self, p):
+        """p パーセンタイルが入るバケットの上限 (秒)"""
+        if not self.count: return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank: return min(self.BASE * 2 ** (index / self.STEPS_PER_OCTAVE), self.max)
+        return self.max
+
+    def summary(self):
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {"count": self.count, "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+                "p50_ms": ms(self.percentile(50)), "p90_ms": ms(self.percentile(90)),
+                "p99_ms": ms(self.percentile(99)), "max_ms": ms(self.max)}
+
+class Diagnostics:
+    """ホットパスの所要時間・イベントループの遅れ・DBの待ち時間をヒストグラムに集める
+
+    環境変数 POMODORO_DIAG=1 か --diag で有効になる。無効時は instrument() が何も包まないので
+    呼び出しのたびのコストはかからない (DB側は enabled の判定1回だけ)。
+    snapshot() を diagnostics.json に書き出せる (診断パネルのボタンと終了時)。
+    """
+
+    def __init__(self, enabled, path="diagnostics.json"):
+        self.enabled = enabled
+        self.path = path
+        self.started = time.time()
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None: histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(max(seconds, 0.0))
+
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try: return func(*args, **kwargs)
+            finally: self.record(name, time.perf_counter() - start)
+        wrapper.__name__ = getattr(func, "__name__", name)
+        return wrapper
+
+    def instrument(self, obj, names, prefix):
+        """obj のメソッドをインスタンス属性で計測付きのものに差し替える (無効時は何もしない)"""
+        if not self.enabled: return
+        for name in names: setattr(obj, name, self.timed(f"{prefix}.{name}", getattr(obj, name)))
+
+    def db_job(self, kind, func):
+        """LogStore のジョブを包み、キューで待った時間と実行時間を分けて記録する"""
+        queued = time.perf_counter()
+        def job(conn):
+            start = time.perf_counter()
+            self.record(f"db.{kind}.wait", start - queued)
+            try: return func(conn)
+            finally: self.record(f"db.{kind}", time.perf_counter() - start)
+        return job
+
+    def snapshot(self):
+        with self.lock:
+            metrics = {name: h.summary() for name, h in sorted(self.histograms.items())}
+        return {"started": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "uptime_s": round(time.time() - self.started, 1), "metrics": metrics}
+
+    def format(self):
+        lines = [f"{'name':<28}{'count':>7}{'p50':>9}{'p99':>9}{'max':>9}  (ms)"]
+        for name, m in self.snapshot()["metrics"].items():
+            lines.append(f"{name:<28}{m['count']:>7}{m['p50_ms']:>9.2f}{m['p99_ms']:>9.2f}{m['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        path = path or self.path
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        return path
+
+DIAG = Diagnostics(os.environ.get("POMODORO_DIAG") == "1" or "--diag" in sys.argv)
 
 # --- 設定 ---
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
-class PomodoroApp(ctk.CTk):
+# --- ノイズ生成 ---
+NOISE_SAMPLE_RATE = 44100
+NOISE_CHUNK_FRAMES = 65536
+
+# Paul Kellet方式ピンクノイズの1次IIR群 (極, 入力ゲイン)
+PINK_POLES = [
+    (0.99886, 0.0555179),
+    (0.99332, 0.0750759),
+    (0.96900, 0.1538520),
+    (0.86650, 0.3104856),
+    (0.55000, 0.5329522),
+    (-0.7616, -0.0168980),
+]
+
+def _iir_block_matrix(a, block):
+    """ブロック内の1次IIRを行列積で解くための下三角テプリッツ行列 T[i, j] = a^(i-j)"""
+    k = np.arange(block)
+    diff = k[:, None] - k[None, :]
+    return np.where(diff >= 0, a ** np.maximum(diff, 0), 0.0)
+
+def _first_order_iir(x, a, b, y0, matrix):
+    """y[n] = a*y[n-1] + b*x[n] をブロック単位で計算し (出力, 最終状態) を返す"""
+    block = matrix.shape[0]
+    n = len(x)
+    pad = (-n) % block
+    xb = np.concatenate([x, np.zeros(pad)]).reshape(-1, block) * b
+    local = xb @ matrix.T
+    # ブロック間の状態伝搬はブロック数ぶんのスカラー漸化式だけで済む
+    carry = np.empty(len(local))
+    a_block = a ** block
+    y = y0
+    for m in range(len(local)):
+        carry[m] = y
+        y = local[m, -1] + a_block * y
+    out = (local + carry[:, None] * (a ** np.arange(1, block + 1))[None, :]).ravel()[:n]
+    return out, (out[-1] if n else y0)
+
+class NoiseSynth:
+    """ホワイト/ピンク/ブラウンノイズをNumPy配列のチャンク単位で生成する"""
+    BLOCK = 256
+
+    def __init__(self, color="white", rate=NOISE_SAMPLE_RATE, seed=None, amplitude=None):
+        if color not in ("white", "pink", "brown"):
+            raise ValueError(f"unknown noise color: {color}")
+        self.color = color
+        self.rate = rate
+        self.amplitude = amplitude if amplitude is not None else (2000 if color == "brown" else 3000)
+        self.rng = np.random.default_rng(seed)
+        # フィルタ状態 (チャンクをまたいで引き継ぐ)
+        if color == "pink":
+            self.poles = [(a, b, _iir_block_matrix(a, self.BLOCK)) for a, b in PINK_POLES]
+            self.pink_state = [0.0] * len(PINK_POLES)
+            self.last_white = 0.0
+        elif color == "brown":
+            self.brown_matrix = _iir_block_matrix(1 / 1.02, self.BLOCK)
+            self.brown_state = 0.0
+
+    def next_chunk(self, n):
+        """n サンプル分の int16 PCM を返す"""
+        white = self.rng.uniform(-1, 1, n)
+        if self.color == "white":
+            val = white * self.amplitude
+        elif self.color == "brown":
+            last, self.brown_state = _first_order_iir(white, 1 / 1.02, 0.02 / 1.02, self.brown_state, self.brown_matrix)
+            val = last * self.amplitude * 30
+        else:
+            # 旧実装は sum(b) と b[6] で1サンプル遅れ項を2回足していたので係数も2倍にして揃える
+            acc = 0.5362 * white
+            acc[0] += 2 * 0.115926 * self.last_white
+            acc[1:] += 2 * 0.115926 * white[:-1]
+            for i, (a, b, matrix) in enumerate(self.poles):
+                y, self.pink_state[i] = _first_order_iir(white, a, b, self.pink_state[i], matrix)
+                acc += y
+            if n: self.last_white = white[-1]
+            val = acc * 0.11 * self.amplitude * 5
+        return np.clip(np.trunc(val), -32000, 32000).astype("<i2")
+
+    def chunks(self, nframes, chunk=NOISE_CHUNK_FRAMES):
+        for start in range(0, nframes, chunk):
+            yield self.next_chunk(min(chunk, nframes - start))
+
+    def render(self, duration):
+        """duration 秒分を1本の配列として返す"""
+        return np.concatenate(list(self.chunks(int(duration * self.rate))))
+
+    def render_loop(self, duration, fade):
+        """末尾の fade 秒を先頭に等パワーでクロスフェードし、ループ再生しても継ぎ目が出ない duration 秒を返す"""
+        n = int(duration * self.rate)
+        overlap = int(fade * self.rate)
+        pcm = self.render((n + overlap) / self.rate).astype(float)
+        t = np.linspace(0, np.pi / 2, overlap)
+        pcm[:overlap] = pcm[:overlap] * np.sin(t) + pcm[n:] * np.cos(t)
+        return np.clip(np.trunc(pcm[:n]), -32000, 32000).astype("<i2")
+
+    def write_wav(self, filename, duration, loop_fade=0):
+        """配列バッファから直接WAVへ書き出す (一時ファイル経由で置き換え)"""
+        tmp = filename + ".tmp"
+        with wave.open(tmp, "wb") as f:
+            f.setnchannels(1); f.setsampwidth(2); f.setframerate(self.rate)
+            if loop_fade:
+                f.writeframes(self.render_loop(duration, loop_fade).tobytes())
+            else:
+                for pcm in self.chunks(int(duration * self.rate)):
+                    f.writeframes(pcm.tobytes())
+        os.replace(tmp, filename)
+
+# BGMメニュー名 -> ノイズの色
+NOISE_BGM = {"White Noise": "white", "Pink Noise (Rain)": "pink", "Brown Noise (River)": "brown"}
+NOISE_DURATION = 5
+NOISE_LOOP_FADE = 0.25
+NOISE_CACHE_VERSION = 2
+
+class NoiseCache:
+    """生成パラメータのハッシュをキーにノイズWAVをキャッシュする (音声ワーカースレッド専用)"""
+
+    def __init__(self, manifest="noise_cache.json"):
+        self.manifest = manifest
+        try:
+            with open(manifest, encoding="utf-8") as f: self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def params(color, duration=NOISE_DURATION, rate=NOISE_SAMPLE_RATE, amplitude=None, loop_fade=NOISE_LOOP_FADE):
+        if amplitude is None: amplitude = 2000 if color == "brown" else 3000
+        return {"color": color, "duration": duration, "rate": rate, "amplitude": amplitude, "loop_fade": loop_fade,
+                "version": NOISE_CACHE_VERSION}
+
+    @staticmethod
+    def key(params):
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def is_valid(self, filename, params):
+        """マニフェストのキーとWAVヘッダ・サイズが一致する場合のみ有効とみなす"""
+        if self.entries.get(filename) != self.key(params): return False
+        nframes = int(params["duration"] * params["rate"])
+        try:
+            if os.path.getsize(filename) < 44 + nframes * 2: return False
+            with wave.open(filename, "rb") as f:
+                return f.getframerate() == params["rate"] and f.getnframes() == nframes and f.getsampwidth() == 2
+        except (OSError, EOFError, wave.Error):
+            return False
+
+    def ensure(self, color, **kwargs):
+        """有効なキャッシュがあればそのパスを、なければ生成してパスを返す"""
+        params = self.params(color, **kwargs)
+        filename = f"{color}_noise.wav"
+        if self.is_valid(filename, params): return filename
+        NoiseSynth(color, rate=params["rate"], amplitude=params["amplitude"]).write_wav(filename, params["duration"], loop_fade=params["loop_fade"])
+        self.entries[filename] = self.key(params)
+        tmp = self.manifest + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.manifest)
+        return filename
+
+
+# --- サウンドライブラリ ---
+SOUND_EXTENSIONS = {".mp3": "mp3", ".ogg": "ogg", ".wav": "wav", ".flac": "flac"}
+SOUND_CACHE_MB = 128
+
+class SoundLibrary:
+    """sounds/ フォルダの索引と、デコード済み Sound の LRU キャッシュ
+
+    索引 (名前・パス・mtime・長さ・形式) は sounds/.index.json に保存し、refresh() では
+    mtime とサイズが変わったファイルだけ調べ直す。長さは WAV ならヘッダから、それ以外は初回デコード時に埋める。
+    キャッシュは memory_mb を超えたら古いものから捨てる。load はワーカー、get はどのスレッドからでも呼べる。
+    """
+
+    def __init__(self, root="sounds", memory_mb=SOUND_CACHE_MB):
+        self.root = root
+        self.index_path = os.path.join(root, ".index.json")
+        self.budget = memory_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # path -> (Sound, バイト数)
+        self.cached_bytes = 0
+        try:
+            with open(self.index_path, encoding="utf-8") as f: self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def names(self):
+        return sorted(self.entries)
+
+    def path(self, name):
+        entry = self.entries.get(name)
+        return entry["path"] if entry else None
+
+    def refresh(self):
+        """追加・変更・削除されたファイルだけ索引に反映する。変化があれば True"""
+        try: scan = [e for e in os.scandir(self.root) if e.is_file() and os.path.splitext(e.name)[1].lower() in SOUND_EXTENSIONS]
+        except FileNotFoundError:
+            try: os.makedirs(self.root)
+            except OSError: pass
+            scan = []
+        entries = {}
+        changed = False
+        for e in scan:
+            name, ext = os.path.splitext(e.name)
+            st = e.stat()
+            old = self.entries.get(name)
+            if old and old["mtime"] == st.st_mtime_ns and old["size"] == st.st_size and old["path"] == e.path:
+                entries[name] = old
+                continue
+            changed = True
+            self.evict(e.path)
+            entries[name] = {"path": e.path, "mtime": st.st_mtime_ns, "size": st.st_size,
+                             "format": SOUND_EXTENSIONS[ext.lower()], "duration": self.probe_duration(e.path)}
+        if changed or len(entries) != len(self.entries):
+            for name in self.entries.keys() - entries.keys(): self.evict(self.entries[name]["path"])
+            self.entries = entries
+            self.save()
+            return True
+        return False
+
+    @staticmethod
+    def probe_duration(path):
+        """デコードせずに分かる長さ (WAVのみ)。分からなければ None"""
+        if not path.lower().endswith(".wav"): return None
+        try:
+            with wave.open(path, "rb") as f: return f.getnframes() / f.getframerate()
+        except (OSError, EOFError, wave.Error):
+            return None
+
+    def save(self):
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            print(f"Sound index save error: {e}")
+
+    def get(self, path):
+        """キャッシュ済みの Sound を返す (なければ None。デコードはしない)"""
+        with self.lock:
+            item = self.cache.get(path)
+            if item is None: return None
+            self.cache.move_to_end(path)
+            return item[0]
+
+    def load(self, path):
+        """Sound を返す。キャッシュになければデコードして入れる (音声ワーカー上で呼ぶ)"""
+        sound = self.get(path)
+        if sound is not None: return sound
+        sound = pygame.mixer.Sound(path)
+        length = sound.get_length()
+        freq, size, channels = pygame.mixer.get_init()
+        nbytes = int(length * freq * channels * abs(size) // 8)
+        for entry in self.entries.values():
+            if entry["path"] == path and entry["duration"] is None:
+                entry["duration"] = round(length, 3)
+                self.save()
+        with self.lock:
+            self.cache[path] = (sound, nbytes)
+            self.cached_bytes += nbytes
+            # 予算より大きい1曲だけは残す (鳴らせなくなるので)
+            while self.cached_bytes > self.budget and len(self.cache) > 1:
+                _, (_, old_bytes) = self.cache.popitem(last=False)
+                self.cached_bytes -= old_bytes
+        return sound
+
+    def evict(self, path):
+        with self.lock:
+            item = self.cache.pop(path, None)
+            if item: self.cached_bytes -= item[1]
+
+# --- BGM再生 ---
+class BgmEngine:
+    """2つのミキサーチャンネルを交互に使うBGM再生 (Tkスレッド専用)
+
+    曲の切り替えは空いている側のチャンネルで新しい Sound を鳴らし始めてクロスフェードするので途切れない。
+    一時停止はフェードアウトしてからチャンネルを pause するだけなので、再開時は同じ位置からフェードインする。
+    フェードは after で STEP_MS ごとに音量を動かす。
+    """
+    FADE_MS = 400
+    STEP_MS = 20
+
+    def __init__(self, channels, after, clock=time.monotonic, volume=0.5):
+        self.channels = channels
+        self.after = after
+        self.clock = clock
+        self.volume = volume
+        self.sounds = [None, None]
+        self.active = 0
+        self.paused = False
+        self.ramps = {}  # チャンネル番号 -> (開始時刻, 長さ秒, 開始音量, 目標音量, 完了時の処理)
+        self.levels = [0.0, 0.0]
+        self.stepping = False
+
+    @property
+    def sound(self):
+        return self.sounds[self.active]
+
+    def play(self, sound):
+        """sound に切り替える。同じ曲で一時停止中なら続きから再開する"""
+        if sound is self.sound:
+            if self.paused: self.resume()
+            return
+        old, new = self.active, 1 - self.active
+        self.cancel_ramp(new)
+        self.channels[new].set_volume(0)
+        self.levels[new] = 0.0
+        self.channels[new].play(sound, loops=-1)
+        self.sounds[new] = sound
+        self.active = new
+        self.fade(new, self.volume)
+        if self.sounds[old] is not None:
+            if self.paused: self.release(old)
+            else: self.fade_out(old)
+        self.paused = False
+
+    def pause(self):
+        if self.sound is None or self.paused: return
+        self.paused = True
+        channel = self.channels[self.active]
+        self.fade(self.active, 0.0, channel.pause)
+
+    def resume(self):
+        if self.sound is None or not self.paused: return
+        self.paused = False
+        self.channels[self.active].unpause()
+        self.fade(self.active, self.volume)
+
+    def stop(self):
+        """両方のチャンネルをフェードアウトして止める"""
+        for i in range(2):
+            if self.sounds[i] is None: continue
+            if self.paused and i == self.active: self.release(i)
+            else: self.fade_out(i)
+        self.paused = False
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.sound is not None and not self.paused and self.active not in self.ramps:
+            self.set_level(self.active, volume)
+
+    def fade_out(self, i):
+        """フェードアウトしてから止める。曲はすぐに手放すので、その間に同じ曲を選んでも鳴らし直せる"""
+        self.sounds[i] = None
+        self.fade(i, 0.0, self.channels[i].stop)
+
+    def release(self, i):
+        self.cancel_ramp(i)
+        self.channels[i].stop()
+        self.sounds[i] = None
+        self.set_level(i, 0.0)
+
+    def set_level(self, i, level):
+        self.levels[i] = level
+        self.channels[i].set_volume(level)
+
+    def cancel_ramp(self, i):
+        self.ramps.pop(i, None)
+
+    def fade(self, i, target, on_done=None):
+        self.ramps[i] = (self.clock(), self.FADE_MS / 1000, self.levels[i], target, on_done)
+        if not self.stepping:
+            self.stepping = True
+            self.after(self.STEP_MS, self.step)
+
+    def step(self):
+        now = self.clock()
+        for i, (start, length, begin, target, on_done) in list(self.ramps.items()):
+            p = min(1.0, (now - start) / length)
+            # 直線 (等ゲイン) にして、同時に始まるフェードイン/アウトの音量の和がクロスフェード中も一定になるようにする
+            if p < 1.0:
+                self.set_level(i, begin + (target - begin) * p)
+                continue
+            del self.ramps[i]
+            # フェード中に音量が変わっていれば最新の値にそろえる
+            self.set_level(i, self.volume if target > 0 else 0.0)
+            if on_done: on_done()
+        if self.ramps: self.after(self.STEP_MS, self.step)
+        else: self.stepping = False
+
+# --- 通知 ---
+# (周波数Hz, 秒)。周波数 0 は無音。ピピピッ×3
+ALARM_PATTERN = ([(1000, 0.2), (0, 0.1)] * 2 + [(1000, 0.2), (0, 0.8)]) * 3
+ALARM_CHANNEL = 0  # ミキサーのチャンネル0はアラーム専用に予約する
+
+def render_alarm(rate=NOISE_SAMPLE_RATE, channels=1, pattern=ALARM_PATTERN, amplitude=12000):
+    """アラームのビープ列を int16 PCM に一度だけ描画する (端は5msでフェードしてクリックを防ぐ)"""
+    parts = []
+    for freq, seconds in pattern:
+        n = int(rate * seconds)
+        if freq == 0:
+            parts.append(np.zeros(n))
+            continue
+        tone = np.sin(2 * np.pi * freq * np.arange(n) / rate) * amplitude
+        ramp = min(n // 2, int(rate * 0.005))
+        tone[:ramp] *= np.linspace(0, 1, ramp)
+        tone[n - ramp:] *= np.linspace(1, 0, ramp)
+        parts.append(tone)
+    pcm = np.concatenate(parts).astype("<i2")
+    return np.repeat(pcm[:, None], channels, axis=1) if channels > 1 else pcm
+
+def pcm_to_wav(pcm, rate):
+    """モノラル int16 PCM をメモリ上のWAVにする"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1); f.setsampwidth(2); f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+class NotifyBackend:
+    """通知の出し先。何もしない (テストや通知手段のない環境用)"""
+    name = "none"
+    def notify(self, title, msg): pass
+    def alarm(self, pcm, rate): pass  # ミキサーが使えないときのアラーム
+    def cancel(self): pass
+
+class WindowsNotifyBackend(NotifyBackend):
+    name = "windows"
+
+    def notify(self, title, msg):
+        winotify.Notification(app_id="Pomodoro Timer", title=title, msg=msg, duration="long").show()
+
+    def alarm(self, pcm, rate):
+        # SND_MEMORY は非同期にできないので通知ワーカー上で鳴らし切る。cancel() で止められる
+        winsound.PlaySound(pcm_to_wav(pcm, rate), winsound.SND_MEMORY | winsound.SND_NODEFAULT)
+
+    def cancel(self):
+        winsound.PlaySound(None, winsound.SND_PURGE)
+
+class DesktopNotifyBackend(NotifyBackend):
+    """Linux デスクトップ (notify-send)"""
+    name = "desktop"
+
+    def notify(self, title, msg):
+        subprocess.run(["notify-send", "-a", "Pomodoro Timer", title, msg], timeout=5, check=False)
+
+NOTIFY_BACKENDS = {b.name: b for b in [NotifyBackend, WindowsNotifyBackend, DesktopNotifyBackend]}
+
+def default_notify_backend():
+    """環境変数 POMODORO_NOTIFY (windows / desktop / none) があればそれ、なければOSから選ぶ"""
+    name = os.environ.get("POMODORO_NOTIFY")
+    if name not in NOTIFY_BACKENDS:
+        if sys.platform == "win32": name = "windows"
+        elif shutil.which("notify-send"): name = "desktop"
+        else: name = "none"
+    return NOTIFY_BACKENDS[name]()
+
+class NotificationDispatcher:
+    """タイマー完了イベントを1本の常駐ワーカーで処理する
+
+    post() した完了イベントはキューに入り、ワーカーが通知とアラームを出す。まとめて届いたイベントは
+    最後の1件に集約し、cancel() より前に積まれたものは捨てる。アラームは一度だけ描画したPCMを
+    初期化済みのミキサーの予約チャンネルで鳴らし、ミキサーがなければバックエンドに任せる。
+    """
+    STOP = object()
+
+    def __init__(self, backend=None, mixer_ready=lambda: False):
+        self.backend = backend or default_notify_backend()
+        self.mixer_ready = mixer_ready
+        self.queue = queue.Queue()
+        self.generation = 0
+        self.alarm_pcm = None
+        self.alarm_sound = None
+        self.thread = threading.Thread(target=self.run, name="notify", daemon=True)
+        self.thread.start()
+
+    def post(self, title, msg, alarm=True):
+        self.queue.put((self.generation, title, msg, alarm))
+
+    def cancel(self):
+        """まだ出していない通知を取り消し、鳴っているアラームを止める"""
+        self.generation += 1
+        if self.alarm_sound is not None:
+            try: pygame.mixer.Channel(ALARM_CHANNEL).stop()
+            except Exception: pass
+        try: self.backend.cancel()
+        except Exception: pass
+
+    def close(self):
+        self.queue.put(self.STOP)
+        self.thread.join(timeout=1)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            # 続けて届いているイベントは最後の1件にまとめる (アラームはどれか1件が求めていれば鳴らす)
+            alarm = False
+            while item is not self.STOP:
+                alarm = alarm or item[3]
+                try: following = self.queue.get_nowait()
+                except queue.Empty: break
+                if following is self.STOP: self.queue.put(following); break
+                item = following
+            if item is self.STOP: return
+            generation, title, msg, _ = item
+            if generation != self.generation: continue
+            try: self.backend.notify(title, msg)
+            except Exception as e: print(f"Notification error: {e}")
+            if alarm and generation == self.generation:
+                try: self.play_alarm()
+                except Exception as e: print(f"Alarm error: {e}")
+
+    def play_alarm(self):
+        if self.mixer_ready():
+            if self.alarm_sound is None:
+                freq, _, channels = pygame.mixer.get_init()
+                self.alarm_sound = pygame.sndarray.make_sound(render_alarm(freq, channels))
+            pygame.mixer.Channel(ALARM_CHANNEL).play(self.alarm_sound)
+        else:
+            if self.alarm_pcm is None: self.alarm_pcm = render_alarm()
+            self.backend.alarm(self.alarm_pcm, NOISE_SAMPLE_RATE)
+
+# --- タイマー ---
+class TimerEngine:
+    """time.monotonic() 上の締切時刻からカウントダウンするTk非依存のタイマー
+
+    残り時間は毎回締切から計算するので、コールバックが遅れても誤差は蓄積しない。
+    clock を差し替えればGUIなしで動作確認できる。
+    """
+
+    def __init__(self, duration, clock=time.monotonic):
+        self.clock = clock
+        self.duration = duration
+        self.elapsed = 0.0  # 一時停止までに経過した秒数
+        self.deadline = None
+
+    @property
+    def running(self):
+        return self.deadline is not None
+
+    def start(self):
+        if self.deadline is None:
+            self.deadline = self.clock() + (self.duration - self.elapsed)
+
+    def pause(self):
+        if self.deadline is not None:
+            self.elapsed = self.duration - max(0.0, self.deadline - self.clock())
+            self.deadline = None
+
+    def reset(self, duration=None):
+        if duration is not None: self.duration = duration
+        self.elapsed = 0.0
+        self.deadline = None
+
+    def remaining(self):
+        """残り秒数 (小数)"""
+        if self.deadline is None: return max(0.0, self.duration - self.elapsed)
+        return max(0.0, self.deadline - self.clock())
+
+    def remaining_display(self):
+        """表示用の残り秒数 (切り上げ)"""
+        return math.ceil(self.remaining())
+
+    def finished(self):
+        return self.remaining() <= 0
+
+    def next_boundary(self):
+        """表示が次に変わるまでの秒数"""
+        remaining = self.remaining()
+        if remaining <= 0: return 0.0
+        return remaining - (math.ceil(remaining) - 1)
+
+# --- 描画 ---
+class LabelRenderer:
+    """ウィジェットごとに前回の値を覚え、変化がない configure を省く"""
+
     def __init__(self):
+        self.last = {}
+        self.configure_count = 0
+
+    def set(self, widget, **kwargs):
+        prev = self.last.setdefault(widget, {})
+        changed = {k: v for k, v in kwargs.items() if prev.get(k) != v}
+        if not changed: return False
+        widget.configure(**changed)
+        prev.update(changed)
+        self.configure_count += 1
+        return True
+
+    def invalidate(self, *widgets):
+        """次回 set で必ず反映させる (引数なしなら全て)"""
+        if not widgets: self.last.clear()
+        for w in widgets: self.last.pop(w, None)
+
+# --- ウィンドウ移動 ---
+class DragController:
+    """バーモードのドラッグ移動
+
+    押した時点のウィンドウ位置とポインタ位置を覚えておき、移動イベントは位置を記録するだけにして
+    geometry の呼び出しは1フレーム (FRAME_MS) に1回へまとめる。離したときに画面端へ吸着させる。
+    """
+    FRAME_MS = 16
+    SNAP_PX = 20
+
+    def __init__(self, window):
+        self.window = window
+        self.origin = None
+        self.pointer = None
+        self.pending = None
+        self.after_id = None
+        self.geometry_calls = 0
+
+    def start(self, event):
+        self.origin = (self.window.winfo_x(), self.window.winfo_y())
+        self.pointer = (event.x_root, event.y_root)
+        self.pending = None
+
+    def move(self, event):
+        if self.origin is None: return
+        self.pending = (self.origin[0] + event.x_root - self.pointer[0], self.origin[1] + event.y_root - self.pointer[1])
+        if self.after_id is None: self.after_id = self.window.after(self.FRAME_MS, self.flush)
+
+    def flush(self):
+        self.after_id = None
+        if self.pending is not None:
+            self.apply(*self.pending)
+            self.pending = None
+
+    def release(self, event):
+        if self.origin is None: return
+        if self.after_id is not None:
+            self.window.after_cancel(self.after_id)
+            self.after_id = None
+        x = self.origin[0] + event.x_root - self.pointer[0]
+        y = self.origin[1] + event.y_root - self.pointer[1]
+        self.apply(*self.snap(x, y))
+        self.origin = self.pending = None
+
+    def snap(self, x, y):
+        w, h = self.window.winfo_width(), self.window.winfo_height()
+        screen_w, screen_h = self.window.winfo_screenwidth(), self.window.winfo_screenheight()
+        if abs(x) <= self.SNAP_PX: x = 0
+        elif abs(screen_w - (x + w)) <= self.SNAP_PX: x = screen_w - w
+        if abs(y) <= self.SNAP_PX: y = 0
+        elif abs(screen_h - (y + h)) <= self.SNAP_PX: y = screen_h - h
+        return x, y
+
+    def apply(self, x, y):
+        self.window.geometry(f"+{x}+{y}")
+        self.geometry_calls += 1
+
+# --- 履歴 ---
+class HistoryModel:
+    """logs を id の降順にページ単位で読み込むモデル (id によるキーセットページング)
+
+    loader(before_id, offset, limit, callback) と counter(callback) は
+    結果をコールバックで返す。保持するページ数は max_pages で上限を設ける。
+    keyset=False のとき (検索結果の関連度順など id 順でない並び) は、常に件数取得時の先頭
+    (before_id=top_id) からの OFFSET で読む。
+    """
+
+    def __init__(self, loader, counter, page_size=100, max_pages=8, keyset=True):
+        self.keyset = keyset
+        self.loader = loader
+        self.counter = counter
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.on_change = None
+        self.generation = 0
+        self.reset(reload=False)
+
+    def reset(self, reload=True):
+        self.generation += 1
+        self.pages = OrderedDict()
+        self.pending = set()
+        self.head = []  # reset 後に追加された行 (新しい順)
+        self.count = 0
+        self.top_id = None
+        # ページ番号 -> そのページ最後の id (-1 は先頭の手前)
+        self.anchor_pages = []
+        self.anchors = {}
+        if reload:
+            gen = self.generation
+            self.counter(lambda result: self._on_count(gen, result))
+
+    def _on_count(self, gen, result):
+        if gen != self.generation: return
+        count, max_id = result
+        self.count = count
+        self.top_id = (max_id or 0) + 1
+        self._set_anchor(-1, self.top_id)
+        self._changed()
+
+    def _set_anchor(self, page, last_id):
+        if page not in self.anchors: bisect.insort(self.anchor_pages, page)
+        self.anchors[page] = last_id
+
+    def __len__(self):
+        return len(self.head) + self.count
+
+    def row(self, index):
+        """index 行目を返す。未読込なら読込を依頼して None を返す"""
+        if index < len(self.head): return self.head[index]
+        index -= len(self.head)
+        if self.top_id is None or index >= self.count: return None
+        page, pos = divmod(index, self.page_size)
+        rows = self.pages.get(page)
+        if rows is None:
+            self._request(page)
+            rows = self.pages.get(page)
+        else:
+            self.pages.move_to_end(page)
+        if rows is None or pos >= len(rows): return None
+        return rows[pos]
+
+    def _request(self, page):
+        if page in self.pending: return
+        # 直前の既知アンカーから読む (隣接ページなら OFFSET 0 の純粋なキーセット)
+        known = self.anchor_pages[bisect.bisect_left(self.anchor_pages, page) - 1] if self.keyset else -1
+        offset = (page - 1 - known) * self.page_size
+        self.pending.add(page)
+        gen = self.generation
+        self.loader(self.anchors[known], offset, self.page_size, lambda rows: self._on_page(gen, page, rows))
+
+    def _on_page(self, gen, page, rows):
+        if gen != self.generation: return
+        self.pending.discard(page)
+        self.pages[page] = rows
+        if rows and self.keyset: self._set_anchor(page, rows[-1][0])
+        while len(self.pages) > self.max_pages: self.pages.popitem(last=False)
+        self._changed()
+
+    def prepend(self, row):
+        self.head.insert(0, row)
+        self._changed()
+
+    def _changed(self):
+        if self.on_change: self.on_change()
+
+class HistoryView(ctk.CTkFrame):
+    """固定数の行ウィジェットを使い回し、スクロールに合わせて中身だけ差し替える履歴リスト"""
+    ROW_HEIGHT = 32
+
+    def __init__(self, master, model, rows=11, width=320, **kwargs):
+        super().__init__(master, width=width, height=rows * self.ROW_HEIGHT, **kwargs)
+        self.model = model
+        model.on_change = self.schedule_render
+        self.first = 0
+        self.render_pending = False
+        self.renderer = LabelRenderer()
+
+        self.list_frame = ctk.CTkFrame(self, fg_color="transparent", width=width - 20, height=rows * self.ROW_HEIGHT)
+        self.list_frame.pack(side="left", fill="both", expand=True)
+        self.list_frame.pack_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.empty_label = ctk.CTkLabel(self.list_frame, text="履歴なし")
+
+        self.pool = []
+        for _ in range(rows):
+            f = ctk.CTkFrame(self.list_frame, height=self.ROW_HEIGHT - 4)
+            date_label = ctk.CTkLabel(f, text="", font=("Yu Gothic UI", 10), width=110, anchor="w")
+            date_label.pack(side="left", padx=5)
+            mins_label = ctk.CTkLabel(f, text="", font=("Arial", 12, "bold"), text_color="#3B8ED0")
+            mins_label.pack(side="right", padx=5)
+            task_label = ctk.CTkLabel(f, text="", font=("Yu Gothic UI", 12), anchor="w")
+            task_label.pack(side="left", padx=5, fill="x", expand=True)
+            self.pool.append((f, date_label, task_label, mins_label))
+
+        for w in [self, self.list_frame] + [w for row in self.pool for w in row]:
+            w.bind("<MouseWheel>", self.on_wheel, add="+")
+            w.bind("<Button-4>", self.on_wheel, add="+")
+            w.bind("<Button-5>", self.on_wheel, add="+")
+
+    def on_wheel(self, event):
+        up = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.first + (-3 if up else 3))
+
+    def on_scrollbar(self, action, value, unit="units"):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.model)))
+        else:
+            step = len(self.pool) if unit == "pages" else 1
+            self.scroll_to(self.first + int(value) * step)
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.model) - len(self.pool)))
+        if first != self.first:
+            self.first = first
+            self.schedule_render()
+
+    def reset(self):
+        self.first = 0
+        self.model.reset()
+
+    def prepend(self, row):
+        # スクロール中なら表示位置を保つ
+        if self.first > 0: self.first += 1
+        self.model.prepend(row)
+
+    def schedule_render(self):
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        total = len(self.model)
+        if total == 0 and self.model.top_id is not None:
+            for f, *_ in self.pool: f.pack_forget()
+            self.empty_label.pack(pady=10)
+            self.scrollbar.set(0, 1)
+            return
+        self.empty_label.pack_forget()
+        for i, (f, date_label, task_label, mins_label) in enumerate(self.pool):
+            index = self.first + i
+            if index >= total:
+                f.pack_forget()
+                continue
+            row = self.model.row(index)
+            if row is None:
+                values = ("", "…", "")
+            else:
+                _, start_ts, end_ts, mins, task, date_str, time_rng = row
+                date_str, time_rng = log_period(start_ts, end_ts, date_str, time_rng)
+                values = (f"{(date_str or '')[5:]} {time_rng if time_rng else ''}", task if task else "-", f"{mins}分")
+            self.renderer.set(date_label, text=values[0])
+            self.renderer.set(task_label, text=values[1])
+            self.renderer.set(mins_label, text=values[2])
+            if not f.winfo_ismapped(): f.pack(fill="x", pady=2, padx=5)
+        if total: self.scrollbar.set(self.first / total, min(1.0, (self.first + len(self.pool)) / total))
+
+# --- データベース ---
+# 履歴・エクスポートで読む logs の列 (この順のタプルを「行」として扱う)
+LOG_COLUMNS = "id, start_ts, end_ts, duration_minutes, task_name, date, time_range"
+
+def parse_time_range(date_str, time_range):
+    """旧形式の date と "HH:MM - HH:MM" から (start_ts, end_ts) を求める。解釈できなければ None
+
+    date は終了日なので、開始時刻の方が遅ければ日付をまたいだセッションとみなす。
+    time_range のない古い行は、その日の0時を start_ts = end_ts として「時刻不明」を表す。
+    """
+    try:
+        day = datetime.date.fromisoformat(date_str)
+        if not time_range:
+            ts = int(datetime.datetime.combine(day, datetime.time()).timestamp())
+            return ts, ts
+        start_str, end_str = [part.strip() for part in time_range.split("-")]
+        start = datetime.datetime.combine(day, datetime.time.fromisoformat(start_str))
+        end = datetime.datetime.combine(day, datetime.time.fromisoformat(end_str))
+    except (TypeError, ValueError):
+        return None
+    if start > end: start -= datetime.timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+def log_period(start_ts, end_ts, date_str=None, time_range=None):
+    """(終了日 "YYYY-MM-DD", "HH:MM - HH:MM") を返す。タイムスタンプのない行は旧列をそのまま使う"""
+    if start_ts is None or end_ts is None: return date_str, time_range
+    if start_ts == end_ts: return datetime.datetime.fromtimestamp(end_ts).strftime("%Y-%m-%d"), time_range
+    start = datetime.datetime.fromtimestamp(start_ts)
+    end = datetime.datetime.fromtimestamp(end_ts)
+    return end.strftime("%Y-%m-%d"), f"{start:%H:%M} - {end:%H:%M}"
+
+class SchemaMigrations:
+    """PRAGMA user_version で管理するスキーマ移行
+
+    STEPS[i] を適用すると user_version が i + 1 になる。既存のDBは user_version 0 のまま
+    列や表が揃っていることがあるので、各手順は既にある物を作り直さないよう書く。
+    """
+
+    @staticmethod
+    def columns(conn, table):
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+    @classmethod
+    def base_schema(cls, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                duration_minutes INTEGER,
+                task_name TEXT,
+                time_range TEXT
+            )
+        """)
+        existing = cls.columns(conn, "logs")
+        for column in ("task_name", "time_range"):
+            if column not in existing: conn.execute(f"ALTER TABLE logs ADD COLUMN {column} TEXT")
+
+    @staticmethod
+    def indexes_and_export_state(conn):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_date ON logs(date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_task ON logs(task_name)")
+        conn.execute("CREATE TABLE IF NOT EXISTS export_state (key TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS export_journal (path TEXT PRIMARY KEY, size INTEGER)")
+
+    @staticmethod
+    def stats_tables(conn):
+        StatsRollup.create_tables(conn)
+
+    @classmethod
+    def timestamps(cls, conn):
+        # 値の埋め戻しは LogStore.backfill_timestamps が少しずつ行う
+        existing = cls.columns(conn, "logs")
+        for column in ("start_ts", "end_ts"):
+            if column not in existing: conn.execute(f"ALTER TABLE logs ADD COLUMN {column} INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_start_ts ON logs(start_ts)")
+
+    @staticmethod
+    def task_search(conn):
+        TaskSearch.create_tables(conn)
+
+    @classmethod
+    def export_flags(cls, conn):
+        # CSVから取り込み直した行は出力済みなので、次のCSV出力で同じファイルに二重に書かない
+        if "exported" not in cls.columns(conn, "logs"): conn.execute("ALTER TABLE logs ADD COLUMN exported INTEGER NOT NULL DEFAULT 0")
+
+    @staticmethod
+    def stats_counted_ids(conn):
+        StatsRollup.track_counted_ids(conn)
+
+    STEPS = ["base_schema", "indexes_and_export_state", "stats_tables", "timestamps", "task_search", "export_flags", "stats_counted_ids"]
+
+    @classmethod
+    def apply(cls, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, step in enumerate(cls.STEPS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                getattr(cls, step)(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+class LogStore:
+    """logs テーブルの永続化層
+
+    専用スレッドが接続を持ち、書き込みはキューに溜まった分をまとめて1トランザクションでコミットする。
+    write/read は Future を返し、callback を渡すと dispatch(callback, result) で結果を返す
+    (GUIでは dispatch に call_in_ui を渡してTkスレッドに戻す)。
+    DBを開けなかった (またはスキーマ移行に失敗した) ときは error にその例外を入れ、以後のジョブはすべてその例外で失敗させる。
+    """
+    BATCH_SIZE = 200
+    STOP = object()
+
+    def __init__(self, path="work_log.db", dispatch=None):
+        self.path = path
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self.jobs = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="logstore", daemon=True)
+        self.thread.start()
+        self.task(self.backfill_timestamps)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        SchemaMigrations.apply(conn)
+        StatsRollup.backfill(conn)
+        return conn
+
+    # --- 公開API (どのスレッドからでも呼べる) ---
+    def write(self, func, callback=None, errback=None):
+        """func(conn) を書き込みトランザクション内で実行する"""
+        return self.submit("write", func, callback, errback)
+
+    def read(self, func, callback=None, errback=None):
+        """func(conn) を実行して結果を返す"""
+        return self.submit("read", func, callback, errback)
+
+    def task(self, func, callback=None, errback=None):
+        """トランザクションを func(conn) 自身が管理する長い処理 (エクスポートなど) を実行する"""
+        return self.submit("task", func, callback, errback)
+
+    def submit(self, kind, func, callback=None, errback=None):
+        future = Future()
+        if DIAG.enabled: func = DIAG.db_job(kind, func)
+        if callback or errback:
+            future.add_done_callback(lambda f: self.deliver(f, callback, errback))
+        self.jobs.put((kind, func, future))
+        return future
+
+    def deliver(self, future, callback, errback):
+        exc = future.exception()
+        if exc is None:
+            if callback: self.dispatch(callback, future.result())
+        else:
+            print(f"LogStore error: {exc}")
+            if errback: self.dispatch(errback, exc)
+
+    def insert_log(self, start_ts, end_ts, minutes, task_name, callback=None):
+        """1件追加し、LOG_COLUMNS の並びの行を返す
+
+        旧形式の date / time_range も併せて書いておく (古い版のアプリやCSVとの互換用)。
+        """
+        date, time_range = log_period(start_ts, end_ts)
+        row = (start_ts, end_ts, minutes, task_name, date, time_range)
+        def job(conn):
+            cur = conn.execute("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, ?, ?, ?, ?)", row)
+            StatsRollup.add(conn, date, minutes, task_name)
+            return (cur.lastrowid,) + row
+        return self.write(job, callback)
+
+    def insert_logs(self, sessions, callback=None):
+        """(start_ts, end_ts, minutes, task_name) の並びをまとめて1つの書き込みとして追加する"""
+        rows = [(start_ts, end_ts, minutes, task_name) + log_period(start_ts, end_ts) for start_ts, end_ts, minutes, task_name in sessions]
+        def job(conn):
+            conn.executemany("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            for _, _, minutes, task_name, date, _ in rows: StatsRollup.add(conn, date, minutes, task_name)
+            return len(rows)
+        return self.write(job, callback)
+
+    def backfill_timestamps(self, conn, last_id=0, batch_size=2000):
+        """date + time_range から start_ts/end_ts を埋める
+
+        1回の呼び出しで batch_size 件だけ処理して自分をキューの後ろに積み直すので、
+        大きなDBでも書き込みロックを長く握らず、他の処理も間に挟まる。
+        """
+        rows = conn.execute("SELECT id, date, time_range FROM logs WHERE start_ts IS NULL AND id > ? ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+        if not rows: return
+        updates = []
+        for log_id, date_str, time_range in rows:
+            parsed = parse_time_range(date_str, time_range)
+            if parsed: updates.append(parsed + (log_id,))
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("UPDATE logs SET start_ts = ?, end_ts = ? WHERE id = ?", updates)
+        conn.execute("COMMIT")
+        next_id = rows[-1][0]
+        self.task(lambda conn: self.backfill_timestamps(conn, next_id, batch_size))
+
+    def close(self, timeout=10):
+        """キューに残った書き込みをすべてコミットしてから接続を閉じる"""
+        self.jobs.put(self.STOP)
+        self.thread.join(timeout)
+
+    # --- ワーカースレッド ---
+    def run(self):
+        try:
+            conn = self.connect()
+        except Exception as e:
+            self.reject_all(e)
+            return
+        job = None
+        while True:
+            if job is None: job = self.jobs.get()
+            if job is self.STOP: break
+            kind, func, future = job
+            job = None
+            if kind != "write":
+                self.run_one(conn, func, future, transaction=False)
+                continue
+            # 続けて並んでいる書き込みをまとめる (読み込みが来たら順序を守ってそこで区切る)
+            batch = [(func, future)]
+            while len(batch) < self.BATCH_SIZE:
+                try: nxt = self.jobs.get_nowait()
+                except queue.Empty: break
+                if nxt is not self.STOP and nxt[0] == "write": batch.append(nxt[1:])
+                else: job = nxt; break
+            self.run_batch(conn, batch)
+        conn.close()
+
+    def reject_all(self, error):
+        """接続できなかったので、close() まで届くジョブをすべて error で失敗させる (errback が呼ばれるように)"""
+        self.error = error
+        print(f"LogStore error: cannot open {self.path}: {error}")
+        while True:
+            job = self.jobs.get()
+            if job is self.STOP: return
+            future = job[2]
+            if future.set_running_or_notify_cancel(): future.set_exception(error)
+
+    def run_one(self, conn, func, future, transaction=True):
+        if not future.set_running_or_notify_cancel(): return
+        try:
+            if transaction: conn.execute("BEGIN IMMEDIATE")
+            result = func(conn)
+            if transaction: self.commit(conn)
+        except BaseException as e:
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def run_batch(self, conn, batch):
+        if len(batch) == 1:
+            self.run_one(conn, *batch[0])
+            return
+        batch = [(func, future) for func, future in batch if future.set_running_or_notify_cancel()]
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results = [func(conn) for func, _ in batch]
+            self.commit(conn)
+        except Exception:
+            # 失敗した1件に巻き込まれないよう1件ずつやり直す
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            for func, future in batch:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    result = func(conn)
+                    self.commit(conn)
+                except BaseException as e:
+                    if conn.in_transaction: conn.execute("ROLLBACK")
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            return
+        for (_, future), result in zip(batch, results): future.set_result(result)
+
+    @staticmethod
+    def commit(conn):
+        """COMMIT (計測有効時は fsync を含む確定時間を記録する)"""
+        if not DIAG.enabled:
+            conn.execute("COMMIT")
+            return
+        start = time.perf_counter()
+        conn.execute("COMMIT")
+        DIAG.record("db.commit", time.perf_counter() - start)
+
+def import_log_rows(conn, rows, exported=False):
+    """LOG_COLUMNS 順の行を id で重複排除しながら logs に取り込み、(追加件数, スキップ件数) を返す
+
+    呼び出し側のトランザクション内で使う。まだ統計に数えていない id (StatsRollup.uncounted_filter) の
+    行だけを加算するので、CSV出力と取り込みを繰り返しても二重に数えず、新しいDBへの取り込みも数える。
+    exported=True (CSVからの取り込み) の行は次のCSV出力で書き出さない。
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_rows (id INTEGER PRIMARY KEY, start_ts INTEGER, end_ts INTEGER, duration_minutes INTEGER, task_name TEXT, date TEXT, time_range TEXT)")
+    conn.execute("DELETE FROM temp.import_rows")
+    conn.executemany("INSERT OR IGNORE INTO temp.import_rows VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    uncounted, params = StatsRollup.uncounted_filter(conn, "t.id")
+    for date, task_name, sessions, minutes in conn.execute(f"""
+            SELECT t.date, t.task_name, COUNT(*), SUM(t.duration_minutes) FROM temp.import_rows t
+            WHERE {uncounted} GROUP BY t.date, t.task_name""", params).fetchall():
+        StatsRollup.add(conn, date, minutes, task_name, sessions)
+    # logs に入らなかった行 (同じ id が既にある) も数えたことにする。入った行はトリガーが記録する
+    conn.execute("INSERT OR IGNORE INTO stats_counted_ids (id) SELECT id FROM temp.import_rows")
+    # rowcount はトリガー (検索索引) による変更を含まない
+    inserted = conn.execute(f"INSERT OR IGNORE INTO logs ({LOG_COLUMNS}, exported) SELECT {LOG_COLUMNS}, ? FROM temp.import_rows", (int(exported),)).rowcount
+    return inserted, len(rows) - inserted
+
+# --- 統計 ---
+class StatsRollup:
+    """日別・ISO週別・タスク日別の集計テーブル
+
+    save_log と同じトランザクションで加算するので、ダッシュボードは logs を走査せず
+    期間の日数ぶんの行だけを読めばよい。集計は累積値であり、CSV出力で logs を
+    消しても減らさない (出力済みの作業も統計には残す)。
+    stats_state.baseline_id より小さい id は集計前に出力済みだった行を表す。
+    どの id を数えたかは stats_counted_ids に残す (logs への挿入時にトリガーで記録)。この表を作る前に
+    数えた id は baseline_id 以上 counted_ids_from 未満の範囲で表す。
+    """
+
+    @staticmethod
+    def create_tables(conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS stats_daily (date TEXT PRIMARY KEY, sessions INTEGER NOT NULL, minutes INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats_weekly (week TEXT PRIMARY KEY, sessions INTEGER NOT NULL, minutes INTEGER NOT NULL)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_task_daily (
+                date TEXT, task_name TEXT, sessions INTEGER NOT NULL, minutes INTEGER NOT NULL,
+                PRIMARY KEY (date, task_name)
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS stats_state (key TEXT PRIMARY KEY, value INTEGER)")
+
+    @staticmethod
+    def track_counted_ids(conn):
+        """stats_counted_ids と記録用トリガーを作る。今 logs にある行は数え済み (または backfill で数える)"""
+        conn.execute("CREATE TABLE IF NOT EXISTS stats_counted_ids (id INTEGER PRIMARY KEY)")
+        conn.execute("INSERT OR IGNORE INTO stats_counted_ids (id) SELECT id FROM logs")
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'logs'").fetchone()
+        conn.execute("INSERT OR IGNORE INTO stats_state (key, value) VALUES ('counted_ids_from', ?)", ((seq[0] if seq else 0) + 1,))
+        conn.execute("CREATE TRIGGER IF NOT EXISTS stats_counted_insert AFTER INSERT ON logs BEGIN INSERT OR IGNORE INTO stats_counted_ids (id) VALUES (new.id); END")
+
+    @staticmethod
+    def uncounted_filter(conn, column):
+        """column の id がまだ統計に数えられていない、という (SQL条件, 引数)"""
+        state = dict(conn.execute("SELECT key, value FROM stats_state WHERE key IN ('baseline_id', 'counted_ids_from')").fetchall())
+        # backfill 前なら範囲は空 (今ある行は backfill が数える)
+        low, high = state.get("baseline_id", 0), state.get("counted_ids_from", 0)
+        return (f"NOT EXISTS (SELECT 1 FROM stats_counted_ids c WHERE c.id = {column}) AND NOT ({column} >= ? AND {column} < ?)",
+                (low, high))
+
+    @staticmethod
+    def iso_week(date_str):
+        year, week, _ = datetime.date.fromisoformat(date_str).isocalendar()
+        return f"{year}-W{week:02d}"
+
+    @classmethod
+    def add(cls, conn, date, minutes, task_name, sessions=1):
+        """1件分 (または sessions 件分) を加算する。呼び出し側のトランザクション内で使う"""
+        # 衝突対象を書いておけば UPSERT は SQLite 3.24 から使える (省略形は 3.35 以降)
+        upsert = " ON CONFLICT({}) DO UPDATE SET sessions = sessions + excluded.sessions, minutes = minutes + excluded.minutes"
+        conn.execute("INSERT INTO stats_daily (date, sessions, minutes) VALUES (?, ?, ?)" + upsert.format("date"), (date, sessions, minutes))
+        conn.execute("INSERT INTO stats_weekly (week, sessions, minutes) VALUES (?, ?, ?)" + upsert.format("week"), (cls.iso_week(date), sessions, minutes))
+        conn.execute("INSERT INTO stats_task_daily (date, task_name, sessions, minutes) VALUES (?, ?, ?, ?)" + upsert.format("date, task_name"),
+                     (date, task_name, sessions, minutes))
+
+    @classmethod
+    def backfill(cls, conn):
+        """集計導入前の logs を一度だけ集計テーブルへ取り込む"""
+        if conn.execute("SELECT 1 FROM stats_state WHERE key = 'baseline_id'").fetchone(): return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            min_id, max_id = conn.execute("SELECT MIN(id), MAX(id) FROM logs").fetchone()
+            if max_id is None:
+                seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'logs'").fetchone()
+                baseline = (seq[0] if seq else 0) + 1
+            else:
+                baseline = min_id
+                for date, task_name, sessions, minutes in conn.execute(
+                        "SELECT date, task_name, COUNT(*), SUM(duration_minutes) FROM logs GROUP BY date, task_name").fetchall():
+                    cls.add(conn, date, minutes, task_name, sessions)
+            conn.execute("INSERT INTO stats_state (key, value) VALUES ('baseline_id', ?)", (baseline,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @classmethod
+    def summary(cls, conn, today=None, top=5):
+        """Statsタブ用の集計 (今日・今週・今月・累計・連続日数・今週の上位タスク)"""
+        today = today or datetime.date.today()
+        week_start = today - datetime.timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
+        def range_total(start):
+            return conn.execute("SELECT COALESCE(SUM(sessions), 0), COALESCE(SUM(minutes), 0) FROM stats_daily WHERE date BETWEEN ? AND ?",
+                                (start.isoformat(), today.isoformat())).fetchone()
+        week = conn.execute("SELECT sessions, minutes FROM stats_weekly WHERE week = ?", (cls.iso_week(today.isoformat()),)).fetchone()
+        total = conn.execute("SELECT COALESCE(SUM(sessions), 0), COALESCE(SUM(minutes), 0) FROM stats_daily").fetchone()
+
+        # 今日まだ記録がなくても昨日まで続いていれば継続中とみなす
+        streak = 0
+        expected = today
+        for (date_str,) in conn.execute("SELECT date FROM stats_daily WHERE date <= ? AND sessions > 0 ORDER BY date DESC", (today.isoformat(),)):
+            day = datetime.date.fromisoformat(date_str)
+            if streak == 0 and day == today - datetime.timedelta(days=1): expected = day
+            if day != expected: break
+            streak += 1
+            expected = day - datetime.timedelta(days=1)
+
+        top_tasks = conn.execute("""
+            SELECT task_name, SUM(minutes) FROM stats_task_daily WHERE date BETWEEN ? AND ?
+            GROUP BY task_name ORDER BY SUM(minutes) DESC LIMIT ?
+        """, (week_start.isoformat(), today.isoformat(), top)).fetchall()
+        return {
+            "today": range_total(today),
+            "week": tuple(week) if week else (0, 0),
+            "month": range_total(month_start),
+            "total": tuple(total),
+            "streak": streak,
+            "top_tasks": top_tasks,
+        }
+
+# --- タスク検索 ---
+class TaskSearch:
+    """logs.task_name の FTS5 索引 (logs_fts) による検索
+
+    logs_fts は logs を中身とする外部コンテンツ表で、挿入・削除・タスク名の更新はトリガーで追従する。
+    部分一致させたいので trigram トークナイザを使う (古いSQLiteでは unicode61 の前方一致)。
+    trigram は3文字未満の語を引けないので、そのときは集計表のタスク名一覧から一致する名前を探して
+    idx_logs_task で引く。FTS5 自体がないSQLiteでも常にこちらの経路で動く。
+    """
+    TRIGGERS = {
+        "logs_fts_insert": "AFTER INSERT ON logs BEGIN INSERT INTO logs_fts (rowid, task_name) VALUES (new.id, new.task_name); END",
+        "logs_fts_delete": "AFTER DELETE ON logs BEGIN INSERT INTO logs_fts (logs_fts, rowid, task_name) VALUES ('delete', old.id, old.task_name); END",
+        "logs_fts_update": """AFTER UPDATE OF task_name ON logs BEGIN
+            INSERT INTO logs_fts (logs_fts, rowid, task_name) VALUES ('delete', old.id, old.task_name);
+            INSERT INTO logs_fts (rowid, task_name) VALUES (new.id, new.task_name);
+        END""",
+    }
+
+    @classmethod
+    def create_tables(cls, conn):
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(task_name, content='logs', content_rowid='id', tokenize='{tokenizer}')")
+                break
+            except sqlite3.OperationalError:
+                continue
+        else:
+            return  # FTS5 なし
+        for name, body in cls.TRIGGERS.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def tokenizer(conn):
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'logs_fts'").fetchone()
+        if row is None: return None
+        return "trigram" if "trigram" in row[0] else "unicode61"
+
+    @classmethod
+    @contextmanager
+    def triggers_suspended(cls, conn, names=("logs_fts_delete",)):
+        """大量の削除や挿入の間だけトリガーを外し、終わったら logs から索引を作り直す (トランザクション内で使う)"""
+        if cls.tokenizer(conn) is None:
+            yield
+            return
+        for name in names: conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        yield
+        conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+        for name in names: conn.execute(f"CREATE TRIGGER {name} {cls.TRIGGERS[name]}")
+
+    @staticmethod
+    def terms(text):
+        return [t for t in text.split() if t]
+
+    @classmethod
+    def match_expr(cls, conn, text):
+        """FTS5 の MATCH 式。FTS で引けない検索語なら None"""
+        tokenizer = cls.tokenizer(conn)
+        terms = cls.terms(text)
+        if tokenizer is None or not terms: return None
+        if tokenizer == "trigram":
+            if any(len(t) < 3 for t in terms): return None
+            return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        return " AND ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+    @classmethod
+    def name_filter(cls, text):
+        """FTS を使えないとき用の (SQL条件, 引数)。記録のあるタスク名から全検索語を含むものに絞る副問い合わせ"""
+        terms = [t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for t in cls.terms(text)]
+        likes = " AND ".join(["task_name LIKE ? ESCAPE '\\'"] * len(terms)) or "1"
+        return f"task_name IN (SELECT DISTINCT task_name FROM stats_task_daily WHERE task_name != '' AND {likes})", [f"%{t}%" for t in terms]
+
+    @classmethod
+    def page(cls, conn, text, before_id, offset, limit):
+        """HistoryModel の loader 用 (keyset=False で使う)。id < before_id の一致行を関連度順に返す
+
+        FTS では bm25 の順 (同点は新しい順)。FTS を使えないときは名前が短いほど検索語の占める割合が
+        大きいので、タスク名の短い順を関連度の代わりにする。
+        """
+        expr = cls.match_expr(conn, text)
+        if expr is not None:
+            return conn.execute(f"""
+                SELECT {LOG_COLUMNS} FROM logs JOIN (
+                    SELECT rowid AS hit, bm25(logs_fts) AS score FROM logs_fts
+                    WHERE logs_fts MATCH ? AND rowid < ? ORDER BY score, rowid DESC LIMIT ? OFFSET ?
+                ) ON id = hit ORDER BY score, id DESC
+            """, (expr, before_id, limit, offset)).fetchall()
+        where, params = cls.name_filter(text)
+        return conn.execute(f"SELECT {LOG_COLUMNS} FROM logs WHERE {where} AND id < ? ORDER BY length(task_name), id DESC LIMIT ? OFFSET ?",
+                            (*params, before_id, limit, offset)).fetchall()
+
+    @classmethod
+    def count(cls, conn, text):
+        """HistoryModel の counter 用。(一致件数, 最大id)"""
+        expr = cls.match_expr(conn, text)
+        if expr is not None:
+            return conn.execute("SELECT COUNT(*), MAX(rowid) FROM logs_fts WHERE logs_fts MATCH ?", (expr,)).fetchone()
+        where, params = cls.name_filter(text)
+        return conn.execute(f"SELECT COUNT(*), MAX(id) FROM logs WHERE {where}", params).fetchone()
+
+class TaskCompleter:
+    """最近のタスク名の使用回数表を持ち、前方一致でいちばん使われている名前を返す (Tkスレッド専用)"""
+
+    def __init__(self):
+        self.counts = {}
+        self.names = []
+
+    @staticmethod
+    def recent_counts(conn, today=None, days=90):
+        """LogStore.read から呼ばれる。直近 days 日のタスク名ごとの回数"""
+        today = today or datetime.date.today()
+        since = (today - datetime.timedelta(days=days)).isoformat()
+        return conn.execute("SELECT task_name, SUM(sessions) FROM stats_task_daily WHERE date >= ? AND task_name != '' GROUP BY task_name", (since,)).fetchall()
+
+    def load(self, counts):
+        self.counts = dict(counts)
+        self.names = sorted(self.counts)
+
+    def add(self, name):
+        if not name: return
+        if name not in self.counts: bisect.insort(self.names, name)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def candidates(self, prefix):
+        lo = bisect.bisect_left(self.names, prefix)
+        hi = bisect.bisect_left(self.names, prefix + "\U0010ffff")
+        return self.names[lo:hi]
+
+    def complete(self, prefix):
+        if not prefix: return None
+        return max(self.candidates(prefix), key=self.counts.__getitem__, default=None)
+
+# --- CSVエクスポート ---
+class CsvExporter:
+    """logs を exports/<date>.csv へストリーミング出力し、出力した行だけを削除する
+
+    date, id 順のカーソルを batch_size 件ずつ読み、開くファイルは常に1つだけ。
+    追記前のファイルサイズを export_journal に記録しておき、削除と最終出力 id (watermark) の
+    コミット前に落ちた場合は次回実行時に追記分を切り詰めてからやり直す。
+    """
+    HEADER = ["ID", "Date", "Minutes", "Task Name", "Time Range"]
+
+    def __init__(self, export_dir="exports", batch_size=1000):
+        self.export_dir = export_dir
+        self.batch_size = batch_size
+
+    def recover(self, conn):
+        """前回の中断で途中まで追記されたファイルを元のサイズに戻す"""
+        for path, size in conn.execute("SELECT path, size FROM export_journal").fetchall():
+            try:
+                if size < 0: os.remove(path)
+                else:
+                    with open(path, "r+b") as f: f.truncate(size)
+            except FileNotFoundError:
+                pass
+        conn.execute("DELETE FROM export_journal")
+
+    def run(self, conn, progress=None):
+        """LogStore.task から呼ばれる。出力した件数を返す"""
+        self.recover(conn)
+        max_id, total = conn.execute("SELECT MAX(id), COUNT(*) FROM logs").fetchone()
+        if not total: return 0
+        # CSVから取り込み直した行はもう書き出してあるので、削除だけする
+        total = conn.execute("SELECT COUNT(*) FROM logs WHERE id <= ? AND exported = 0", (max_id,)).fetchone()[0]
+        os.makedirs(self.export_dir, exist_ok=True)
+
+        done = 0
+        current_date = None
+        f = writer = None
+        # start_ts 順に読む (日付をまたいだセッションで同じ日のファイルを開き直すことはあるが、常に1つだけ)
+        cur = conn.execute(f"SELECT {LOG_COLUMNS} FROM logs WHERE id <= ? AND exported = 0 ORDER BY start_ts, id", (max_id,))
+        try:
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if not rows: break
+                for log_id, start_ts, end_ts, minutes, task_name, date_str, time_range in rows:
+                    date_str, time_range = log_period(start_ts, end_ts, date_str, time_range)
+                    if date_str != current_date:
+                        if f: self.close_file(f)
+                        current_date = date_str
+                        f, writer = self.open_file(conn, current_date)
+                    writer.writerow((log_id, date_str, minutes, task_name, time_range))
+                done += len(rows)
+                if progress: progress(done, total)
+        finally:
+            if f: self.close_file(f)
+
+        # 削除・watermark・ジャーナル消去を1トランザクションで確定する (検索索引は1行ずつ消さず最後に作り直す)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            with TaskSearch.triggers_suspended(conn):
+                conn.execute("DELETE FROM logs WHERE id <= ?", (max_id,))
+            conn.execute("INSERT OR REPLACE INTO export_state (key, value) VALUES ('last_exported_id', ?)", (max_id,))
+            conn.execute("DELETE FROM export_journal")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return done
+
+    def open_file(self, conn, date_key):
+        filename = f"{self.export_dir}/{date_key}.csv"
+        file_exists = os.path.isfile(filename)
+        conn.execute("INSERT OR IGNORE INTO export_journal (path, size) VALUES (?, ?)", (filename, os.path.getsize(filename) if file_exists else -1))
+        f = open(filename, "a", newline="", encoding="utf-8_sig")
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(self.HEADER)
+        return f, writer
+
+    @staticmethod
+    def close_file(f):
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+
+# --- CSV取り込み ---
+class CsvImporter:
+    """CsvExporter が書いた exports/<date>.csv を logs に読み戻す
+
+    run() は LogStore の外 (呼び出し元のスレッド) でファイルを解析し、batch_size 行ずつ
+    import_log_rows の書き込みジョブとして LogStore に渡す。書き込みは常に1つだけ待ち、解析も
+    先読みを 2×workers 単位までに抑えるので、メモリ使用量はファイル数によらない。
+    元の ID で重複排除するため何度取り込んでも増えず、取り込んだ行は出力済みとして扱う。
+    ファイルが POOL_MIN_FILES 個以上あれば解析をプロセスプールで並列に行う (FILES_PER_TASK 個ずつ)。
+    """
+    POOL_MIN_FILES = 1000
+    FILES_PER_TASK = 64
+
+    def __init__(self, paths, batch_size=5000, workers=None):
+        self.paths = self.expand(paths)
+        self.batch_size = batch_size
+        self.workers = workers if workers is not None else min(4, os.cpu_count() or 1)
+
+    @staticmethod
+    def expand(paths):
+        """フォルダはその中の *.csv (名前順) に展開する"""
+        files = []
+        for path in [paths] if isinstance(paths, str) else paths:
+            if os.path.isdir(path):
+                files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".csv")))
+            else:
+                files.append(path)
+        return files
+
+    @staticmethod
+    def parse_file(path):
+        """1ファイルを LOG_COLUMNS 順の行に変換し (行のリスト, 不正な行数, エラー) を返す (子プロセスでも動く)"""
+        rows = []
+        malformed = 0
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                if next(reader, None) != CsvExporter.HEADER: return [], 0, "ヘッダが違います"
+                for record in reader:
+                    try:
+                        log_id, date_str, minutes, task_name, time_range = record
+                        period = parse_time_range(date_str, time_range)
+                        if period is None: raise ValueError(time_range)
+                        rows.append((int(log_id), *period, int(minutes), task_name, date_str, time_range or None))
+                    except ValueError:
+                        malformed += 1
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            return rows, malformed, str(e)
+        return rows, malformed, None
+
+    @classmethod
+    def parse_files(cls, paths):
+        return [cls.parse_file(path) for path in paths]
+
+    def parsed(self):
+        """(パス, 解析結果) をファイル順に返す"""
+        if self.workers <= 1 or len(self.paths) < self.POOL_MIN_FILES:
+            for path in self.paths: yield path, self.parse_file(path)
+            return
+        from concurrent.futures import ProcessPoolExecutor
+        tasks = [self.paths[i:i + self.FILES_PER_TASK] for i in range(0, len(self.paths), self.FILES_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for paths in tasks:
+                # 取り出しが追いつかないときに結果が溜まらないよう、同時に投げるのは 2×workers 個まで
+                if len(pending) >= 2 * self.workers:
+                    done_paths, future = pending.popleft()
+                    yield from zip(done_paths, future.result())
+                pending.append((paths, pool.submit(self.parse_files, paths)))
+            while pending:
+                done_paths, future = pending.popleft()
+                yield from zip(done_paths, future.result())
+
+    def run(self, store, progress=None):
+        """LogStore のワーカー以外のスレッドから呼ぶ。結果の集計を dict で返す"""
+        summary = {"files": len(self.paths), "inserted": 0, "skipped": 0, "malformed": 0, "failed_files": []}
+        writing = None
+
+        def wait():
+            inserted, skipped = writing.result()
+            summary["inserted"] += inserted
+            summary["skipped"] += skipped
+
+        batch = []
+        for done, (path, (rows, malformed, error)) in enumerate(self.parsed(), start=1):
+            summary["malformed"] += malformed
+            if error: summary["failed_files"].append(f"{path}: {error}")
+            batch.extend(rows)
+            if len(batch) >= self.batch_size:
+                if writing: wait()
+                writing = store.write(lambda conn, rows=batch: import_log_rows(conn, rows, exported=True))
+                batch = []
+            if progress: progress(done, len(self.paths))
+        if writing: wait()
+        if batch:
+            writing = store.write(lambda conn: import_log_rows(conn, batch, exported=True))
+            wait()
+        return summary
+
+# --- アーカイブ ---
+class ArchiveExporter:
+    """logs を消さずに、前回以降の行だけを月ごとの圧縮セグメントへ書き出す
+
+    archive/<YYYY-MM>/logs-<最小id>-<最大id>.csv.gz (pyarrow があれば .parquet も) を作り、
+    archive/manifest.json にセグメントごとの件数・id範囲・ハッシュと出力済みの最終 id を記録する。
+    manifest はセグメントを書き終えてから置き換えるので、途中で落ちても次回同じ範囲を書き直すだけで済む。
+    """
+    HEADER = ["ID", "Start TS", "End TS", "Minutes", "Task Name", "Date", "Time Range"]
+
+    def __init__(self, archive_dir="archive", batch_size=1000, columnar=True):
+        self.archive_dir = archive_dir
+        self.manifest_path = os.path.join(archive_dir, "manifest.json")
+        self.batch_size = batch_size
+        self.columnar = columnar and self.pyarrow() is not None
+
+    @staticmethod
+    def pyarrow():
+        try:
+            import pyarrow, pyarrow.parquet
+            return pyarrow
+        except ImportError:
+            return None
+
+    @classmethod
+    def arrow_schema(cls):
+        """Parquet の列型 (バッチから推測すると start_ts が全部 NULL のバッチで null 型になり、次のバッチと合わない)"""
+        pa = cls.pyarrow()
+        return pa.schema([("id", pa.int64()), ("start_ts", pa.int64()), ("end_ts", pa.int64()), ("duration_minutes", pa.int64()),
+                          ("task_name", pa.string()), ("date", pa.string()), ("time_range", pa.string())])
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError):
+            return {"version": 1, "last_id": 0, "segments": []}
+
+    def save_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    @staticmethod
+    def file_hash(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+        return h.hexdigest()
+
+    def run(self, conn, progress=None):
+        """LogStore.task から呼ばれる。書き出した件数を返す"""
+        manifest = self.load_manifest()
+        last_id = manifest["last_id"]
+        max_id, total = conn.execute("SELECT MAX(id), COUNT(*) FROM logs WHERE id > ?", (last_id,)).fetchone()
+        if not total: return 0
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        segments = {}  # 月 -> ArchiveSegment
+        done = 0
+        cur = conn.execute(f"SELECT {LOG_COLUMNS} FROM logs WHERE id > ? AND id <= ? ORDER BY id", (last_id, max_id))
+        try:
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if not rows: break
+                by_month = {}
+                for row in rows:
+                    by_month.setdefault(self.row_month(row), []).append(row)
+                for month, month_rows in by_month.items():
+                    if month not in segments: segments[month] = ArchiveSegment(self, month)
+                    segments[month].write(month_rows)
+                done += len(rows)
+                if progress: progress(done, total)
+            entries = [segment.close() for segment in segments.values()]
+        except BaseException:
+            for segment in segments.values(): segment.abort()
+            raise
+
+        manifest["segments"].extend(entries)
+        manifest["last_id"] = max_id
+        self.save_manifest(manifest)
+        return done
+
+    @staticmethod
+    def row_month(row):
+        date_str, _ = log_period(row[1], row[2], row[5], row[6])
+        return (date_str or "unknown")[:7]
+
+    def read_segment(self, entry):
+        """セグメントの行を LOG_COLUMNS 順のタプルで順に返す"""
+        with gzip.open(os.path.join(self.archive_dir, entry["file"]), "rt", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for log_id, start_ts, end_ts, minutes, task_name, date_str, time_range in reader:
+                yield (int(log_id), int(start_ts) if start_ts else None, int(end_ts) if end_ts else None,
+                       int(minutes), task_name, date_str or None, time_range or None)
+
+    def verify(self, deep=False):
+        """manifest と実ファイルを照合し、問題のあるセグメントの一覧を返す (deep なら件数とid範囲も数え直す)"""
+        problems = []
+        for entry in self.load_manifest()["segments"]:
+            path = os.path.join(self.archive_dir, entry["file"])
+            if not os.path.exists(path): problems.append((entry["file"], "missing")); continue
+            if self.file_hash(path) != entry["sha256"]: problems.append((entry["file"], "hash mismatch")); continue
+            if deep:
+                ids = [row[0] for row in self.read_segment(entry)]
+                if len(ids) != entry["rows"] or (ids and (min(ids), max(ids)) != (entry["min_id"], entry["max_id"])):
+                    problems.append((entry["file"], "row mismatch"))
+        return problems
+
+    def reimport(self, conn, progress=None):
+        """manifest 上の各セグメントのうち、DBに欠けている id 範囲のものだけを読み戻す"""
+        segments = self.load_manifest()["segments"]
+        inserted = skipped = 0
+        for i, entry in enumerate(segments):
+            present = conn.execute("SELECT COUNT(*) FROM logs WHERE id BETWEEN ? AND ?", (entry["min_id"], entry["max_id"])).fetchone()[0]
+            if present >= entry["rows"]:
+                skipped += entry["rows"]
+            else:
+                rows = self.read_segment(entry)
+                while True:
+                    batch = [row for _, row in zip(range(self.batch_size), rows)]
+                    if not batch: break
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        added, dup = import_log_rows(conn, batch)
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                    inserted += added; skipped += dup
+            if progress: progress(i + 1, len(segments))
+        return inserted, skipped
+
+    def reexport(self, conn, file):
+        """DBに行が残っているセグメントを manifest の id 範囲から作り直す (verify で壊れていた場合など)"""
+        manifest = self.load_manifest()
+        for i, entry in enumerate(manifest["segments"]):
+            if entry["file"] != file: continue
+            segment = ArchiveSegment(self, entry["month"])
+            cur = conn.execute(f"SELECT {LOG_COLUMNS} FROM logs WHERE id BETWEEN ? AND ? ORDER BY id", (entry["min_id"], entry["max_id"]))
+            try:
+                while True:
+                    rows = cur.fetchmany(self.batch_size)
+                    if not rows: break
+                    rows = [row for row in rows if self.row_month(row) == entry["month"]]
+                    if rows: segment.write(rows)
+                if segment.rows != entry["rows"]:
+                    raise ValueError(f"{file}: DBに残っている行が {segment.rows}/{entry['rows']} 件しかありません")
+                new_entry = segment.close()
+            except BaseException:
+                segment.abort()
+                raise
+            manifest["segments"][i] = new_entry
+            self.save_manifest(manifest)
+            return new_entry
+        raise KeyError(file)
+
+class ArchiveSegment:
+    """1回の出力で1か月分を書き込むセグメント (一時ファイルに書き、close で確定する)"""
+
+    def __init__(self, archiver, month):
+        self.archiver = archiver
+        self.month = month
+        self.rows = 0
+        self.min_id = self.max_id = None
+        os.makedirs(os.path.join(archiver.archive_dir, month), exist_ok=True)
+        self.tmp_path = os.path.join(archiver.archive_dir, month, f".writing-{os.getpid()}.csv.gz")
+        self.file = gzip.open(self.tmp_path, "wt", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(ArchiveExporter.HEADER)
+        self.parquet = None
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        if self.archiver.columnar: self.write_columnar(rows)
+        self.rows += len(rows)
+        self.min_id = rows[0][0] if self.min_id is None else self.min_id
+        self.max_id = rows[-1][0]
+
+    def write_columnar(self, rows):
+        pa = self.archiver.pyarrow()
+        schema = self.archiver.arrow_schema()
+        table = pa.table({name: [row[i] for row in rows] for i, name in enumerate(schema.names)}, schema=schema)
+        if self.parquet is None:
+            self.parquet_tmp = self.tmp_path[:-len(".csv.gz")] + ".parquet"
+            self.parquet = pa.parquet.ParquetWriter(self.parquet_tmp, schema)
+        self.parquet.write_table(table)
+
+    def close(self):
+        """ファイル名を確定して manifest 用のエントリを返す"""
+        self.file.close()
+        base = os.path.join(self.month, f"logs-{self.min_id:08d}-{self.max_id:08d}")
+        final = os.path.join(self.archiver.archive_dir, base + ".csv.gz")
+        os.replace(self.tmp_path, final)
+        entry = {"file": base + ".csv.gz", "month": self.month, "format": "csv.gz", "rows": self.rows,
+                 "min_id": self.min_id, "max_id": self.max_id, "sha256": self.archiver.file_hash(final)}
+        if self.parquet is not None:
+            self.parquet.close()
+            os.replace(self.parquet_tmp, os.path.join(self.archiver.archive_dir, base + ".parquet"))
+            entry["columnar"] = base + ".parquet"
+        return entry
+
+    def abort(self):
+        self.file.close()
+        if self.parquet is not None: self.parquet.close()
+        for path in (self.tmp_path, getattr(self, "parquet_tmp", None)):
+            if path and os.path.exists(path): os.remove(path)
+
+# --- タイマーサービス ---
+class ServiceTimer:
+    """サービス上の1つのタイマー。generation は締切ヒープ上の古いエントリを無効にするために使う"""
+
+    def __init__(self, timer_id, minutes, clock):
+        self.timer_id = timer_id
+        self.minutes = minutes
+        self.mode = "focus"
+        self.task = ""
+        self.engine = TimerEngine(minutes * 60, clock=clock)
+        self.generation = 0
+        self.logged = 0  # logs への書き込みが終わった Focus セッションの数 (クライアントが履歴を読み直す合図)
+
+    def status(self):
+        return {"id": self.timer_id, "minutes": self.minutes, "mode": self.mode, "task": self.task,
+                "running": self.engine.running, "duration": self.engine.duration, "remaining": self.engine.remaining(),
+                "logged": self.logged}
+
+class TimerService:
+    """多数のタイマーを1つの asyncio ループで動かすヘッドレスサービス (python pomodoro.py --serve)
+
+    タイマーごとに毎秒 tick するのではなく、締切 (deadline) のヒープの先頭まで眠り、
+    期限が来たものだけを処理する。完了した Focus セッションは LogStore 経由で logs に書く
+    (LogStore がキューに溜まった分をまとめてコミットする)。
+    """
+    MAX_MINUTES = 24 * 60
+
+    def __init__(self, store=None, clock=time.monotonic, lateness_samples=100000):
+        self.store = store
+        self.clock = clock
+        self.timers = {}
+        self.heap = []  # (deadline, generation, timer_id)
+        self.wakeup = None
+        self.wakeups = 0
+        self.completed = 0
+        self.started_at = clock()
+        self.pending_logs = []
+        self.pending_timers = []  # pending_logs と同じ並びのタイマー
+        self.lateness = deque(maxlen=lateness_samples)
+
+    # --- 操作 ---
+    def get(self, timer_id):
+        timer = self.timers.get(timer_id)
+        if timer is None: raise KeyError(timer_id)
+        return timer
+
+    @classmethod
+    def check_minutes(cls, minutes):
+        """None (指定なし) か 1〜MAX_MINUTES の整数だけを通す。それ以外は ValueError (HTTP では 400)"""
+        if minutes is None: return None
+        if type(minutes) is not int or not 1 <= minutes <= cls.MAX_MINUTES:
+            raise ValueError(f"minutes must be an integer between 1 and {cls.MAX_MINUTES}: {minutes!r}")
+        return minutes
+
+    def start(self, timer_id, minutes=None, mode=None, task=None):
+        minutes = self.check_minutes(minutes)
+        timer = self.timers.get(timer_id)
+        if timer is None:
+            timer = self.timers[timer_id] = ServiceTimer(timer_id, minutes or 25, self.clock)
+        if timer.engine.finished() or (minutes and minutes != timer.minutes):
+            timer.minutes = minutes or timer.minutes
+            timer.engine.reset(timer.minutes * 60)
+        if mode: timer.mode = mode
+        if task is not None: timer.task = task
+        if not timer.engine.running:
+            timer.engine.start()
+            timer.generation += 1
+            self.push(timer)
+        return timer.status()
+
+    def pause(self, timer_id):
+        timer = self.get(timer_id)
+        timer.engine.pause()
+        timer.generation += 1
+        return timer.status()
+
+    def reset(self, timer_id, minutes=None):
+        minutes = self.check_minutes(minutes)
+        timer = self.timers.get(timer_id)
+        if timer is None:
+            timer = self.timers[timer_id] = ServiceTimer(timer_id, minutes or 25, self.clock)
+        if minutes: timer.minutes = minutes
+        timer.engine.reset(timer.minutes * 60)
+        timer.generation += 1
+        return timer.status()
+
+    def stats(self):
+        samples = sorted(self.lateness)
+        def pct(p): return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 if samples else None
+        uptime = self.clock() - self.started_at
+        return {"timers": len(self.timers), "running": sum(t.engine.running for t in self.timers.values()),
+                "completed": self.completed, "wakeups": self.wakeups, "wakeups_per_sec": self.wakeups / uptime if uptime else 0,
+                "lateness_p50_ms": pct(0.5), "lateness_p99_ms": pct(0.99)}
+
+    # --- スケジューラ ---
+    def push(self, timer):
+        earliest = self.heap[0][0] if self.heap else None
+        heapq.heappush(self.heap, (timer.engine.deadline, timer.generation, timer.timer_id))
+        # 先頭が早まったときだけスケジューラを起こし直す
+        if self.wakeup is not None and (earliest is None or timer.engine.deadline < earliest): self.wakeup.set()
+
+    def complete(self, timer, lateness):
+        timer.engine.pause()
+        self.completed += 1
+        self.lateness.append(lateness)
+        if self.store is not None and timer.mode == "focus":
+            end_ts = int(time.time())
+            self.pending_logs.append((end_ts - timer.minutes * 60, end_ts, timer.minutes, timer.task or "名無しのタスク"))
+            self.pending_timers.append(timer)
+
+    def on_logs_written(self, loop, timers, future):
+        """LogStore のスレッドから呼ばれる。書き込みが成功したらループ上で logged を進める"""
+        if future.exception() is not None: return
+        try: loop.call_soon_threadsafe(self.mark_logged, timers)
+        except RuntimeError: pass  # ループは終了済み
+
+    def mark_logged(self, timers):
+        for timer in timers: timer.logged += 1
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        while True:
+            now = self.clock()
+            while self.heap and self.heap[0][0] <= now:
+                deadline, generation, timer_id = heapq.heappop(self.heap)
+                timer = self.timers.get(timer_id)
+                if timer is None or timer.generation != generation or not timer.engine.running: continue
+                self.complete(timer, now - deadline)
+            # 同じ起床で完了した分は1回の書き込みにまとめる
+            if self.pending_logs:
+                future = self.store.insert_logs(self.pending_logs)
+                timers, loop = self.pending_timers, asyncio.get_running_loop()
+                future.add_done_callback(lambda f: self.on_logs_written(loop, timers, f))
+                self.pending_logs, self.pending_timers = [], []
+            timeout = self.heap[0][0] - now if self.heap else None
+            self.wakeup.clear()
+            try: await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError: pass
+            self.wakeups += 1
+
+    # --- HTTP (127.0.0.1 のみで待ち受ける簡易JSON API) ---
+    def route(self, method, path, body):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if method == "GET" and parts == ["timers"]: return 200, [t.status() for t in self.timers.values()]
+        if method == "GET" and parts == ["stats"]: return 200, self.stats()
+        if len(parts) in (2, 3) and parts[0] == "timers":
+            timer_id = parts[1]
+            if method == "GET" and len(parts) == 2: return 200, self.get(timer_id).status()
+            if method == "POST" and len(parts) == 3:
+                if parts[2] == "start": return 200, self.start(timer_id, body.get("minutes"), body.get("mode"), body.get("task"))
+                if parts[2] == "pause": return 200, self.pause(timer_id)
+                if parts[2] == "reset": return 200, self.reset(timer_id, body.get("minutes"))
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""): break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length": length = int(value)
+            body = json.loads(await reader.readexactly(length)) if length else {}
+            status, result = self.route(method, path, body)
+        except KeyError as e:
+            status, result = 404, {"error": f"unknown timer: {e}"}
+        except Exception as e:
+            status, result = 400, {"error": str(e)}
+        payload = json.dumps(result, ensure_ascii=False).encode()
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+        writer.close()
+
+def run_service(host="127.0.0.1", port=8765, db_path="work_log.db"):
+    store = LogStore(db_path)
+    service = TimerService(store)
+    async def main():
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"Pomodoro timer service: http://{host}:{port}")
+        async with server:
+            await asyncio.gather(server.serve_forever(), service.run())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+class ServiceClient:
+    """--attach 時にタイマーサービスへ操作を送るクライアント (通信は専用スレッドで行う)"""
+
+    def __init__(self, url, timer_id):
+        self.url = url.rstrip("/")
+        self.timer_id = timer_id
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="service")
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib_request.Request(self.url + path, data=data, method=method, headers={"Content-Type": "application/json"})
+        with urllib_request.urlopen(req, timeout=5) as res:
+            return json.loads(res.read())
+
+    def send(self, action, callback=None, **payload):
+        return self.call("POST", f"/timers/{self.timer_id}/{action}", payload, callback)
+
+    def status(self, callback=None):
+        return self.call("GET", f"/timers/{self.timer_id}", None, callback)
+
+    def call(self, method, path, payload, callback):
+        future = self.executor.submit(self.request, method, path, payload)
+        def done(f):
+            if f.exception() is not None: print(f"Timer service error: {f.exception()}")
+            elif callback: callback(f.result())
+        future.add_done_callback(done)
+        return future
+
+class PomodoroApp(ctk.CTk):
+    # --diag のときに所要時間を計測するメソッド (ボタンやバインドに渡す前に差し替える)
+    DIAG_UI_PATHS = ["count_down", "update_time_display", "update_clock", "load_history", "save_log", "export_csv", "play_bgm", "do_move"]
+    DIAG_AUDIO_PATHS = ["resolve_bgm_file"]
+
+    def __init__(self, service=None):
         super().__init__()
+        self.service = service  # ServiceClient (--attach 時のみ)
+        self.remote_logged = 0  # サービスが書き終えたセッション数 (最後に受け取った状態の値)
+        DIAG.instrument(self, self.DIAG_UI_PATHS, "ui")
+        DIAG.instrument(self, self.DIAG_AUDIO_PATHS, "audio")
+        self.tick_due = None
+        self.diag_window = None
 
         # アプリ基本設定
         self.title("Modern Pomodoro")
@@ -30,32 +2206,70 @@ class PomodoroApp(ctk.CTk):
         self.timer_running = False
         self.timer_seconds = 25 * 60
         self.selected_duration = 25 * 60
-        self.timer_id = None
+        self.timer_id = None  # 時計とタイマー共通の tick の after ID
+        self.renderer = LabelRenderer()
+        self.window_title = None
+        self.engine = TimerEngine(self.selected_duration)
         self.view_mode = "main" # main, mini, bar
+        # ビュー名 -> 作成関数。Mini/Bar は初めて切り替えたときに作る
+        self.view_builders = {"main": self.create_main_layout, "mini": self.create_mini_layout, "bar": self.create_bar_layout}
+        self.views = {}
+        self.start_state = ("START", "#1f6aa5")
         self.is_typing = False 
+        self.task_completer = TaskCompleter()
+        self.ime_composing = False
+        self.search_text = ""
+        self.search_after = None
         
-        # ドラッグ移動用変数
-        self.drag_start_x = 0
-        self.drag_start_y = 0
+        # ドラッグ移動
+        self.drag = DragController(self)
         
-        # 音声初期化
-        self.init_audio()
+        # スレッドからUIへ処理を戻すためのキュー
+        self.ui_queue = queue.Queue()
+
+        # 音声まわりは専用ワーカーで遅延初期化
+        self.audio_ready = False
+        self.audio_requested = False
+        self.audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
+        self.noise_cache = None
+        self.sound_library = SoundLibrary()
+        self.sound_refreshed = 0.0
+        self.bgm_files = {}
+        self.bgm_pending = set()
+        self.bgm = None
+        self.notifier = NotificationDispatcher(mixer_ready=lambda: self.audio_ready)
         
         # データベース初期化＆更新
-        self.init_db()
+        with TRACE.phase("init_db"):
+            self.init_db()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # UIレイアウト作成
-        self.create_main_layout()
-        self.create_mini_layout()
-        self.create_bar_layout()
+        # UIレイアウト作成 (メインのみ。Mini/Bar は必要になってから)
+        self.get_view("main")
+        with TRACE.phase("load_history"):
+            self.load_history()
         
         # 初期状態はメインモードを表示
         # 起動時に画面中央へ
-        self.center_window_on_start(400, 700)
-        self.show_main_view()
+        with TRACE.phase("show_main_view"):
+            self.center_window_on_start(400, 700)
+            self.show_main_view()
+
+        # sounds/ の索引は裏で更新し、終わったらBGMメニューに反映する
+        self.refresh_sounds()
+        self.bind("<FocusIn>", lambda e: self.refresh_sounds(), add="+")
 
         # 時計の更新開始
-        self.update_clock()
+        self.tick()
+        self.process_ui_queue()
+        if DIAG.enabled:
+            self.bind("<Control-Shift-D>", self.toggle_diagnostics)
+            self.probe_loop_lag(time.perf_counter())
+        self.after(0, self.on_first_frame)
+
+    def on_first_frame(self):
+        TRACE.mark("first frame")
+        TRACE.report()
 
     def center_window_on_start(self, w, h):
         """起動時に画面中央に配置する"""
@@ -65,59 +2279,87 @@ class PomodoroApp(ctk.CTk):
         y = (screen_h - h) // 2
         self.geometry(f"{w}x{h}+{x}+{y}")
 
+    def call_in_ui(self, func, *args):
+        """ワーカースレッドから呼ばれ、func をTkスレッドで実行させる"""
+        self.ui_queue.put((func, args))
+
+    def process_ui_queue(self):
+        while True:
+            try: func, args = self.ui_queue.get_nowait()
+            except queue.Empty: break
+            try: func(*args)
+            except Exception as e: print(f"UI callback error: {e}")
+        self.after(50, self.process_ui_queue)
+
+    def ensure_audio(self):
+        """初めて音が必要になったときにミキサー初期化を音声ワーカーへ投げる"""
+        if not self.audio_requested:
+            self.audio_requested = True
+            self.audio_executor.submit(self.init_audio)
+
     def init_audio(self):
-        pygame.mixer.init()
-        self.generate_noise_file("white_noise.wav", "white")
-        self.generate_noise_file("pink_noise.wav", "pink")
-        self.generate_noise_file("brown_noise.wav", "brown")
-
-    def generate_noise_file(self, filename, color="white", duration=5):
-        if os.path.exists(filename): return
-        framerate = 44100
-        nframes = duration * framerate
-        noise_data = []
-        vol = 2000 if color == "brown" else 3000
-        last_val = 0
-        b = [0.0] * 7
-        for _ in range(nframes):
-            white = random.uniform(-1, 1)
-            if color == "white": val = white * vol
-            elif color == "brown":
-                last_val = (last_val + (0.02 * white)) / 1.02
-                val = last_val * vol * 30
-            elif color == "pink":
-                b[0] = 0.99886 * b[0] + white * 0.0555179
-                b[1] = 0.99332 * b[1] + white * 0.0750759
-                b[2] = 0.96900 * b[2] + white * 0.1538520
-                b[3] = 0.86650 * b[3] + white * 0.3104856
-                b[4] = 0.55000 * b[4] + white * 0.5329522
-                b[5] = -0.7616 * b[5] - white * 0.0168980
-                val = (sum(b) + b[6] + white * 0.5362) * 0.11 * vol * 5
-                b[6] = white * 0.115926
-            else: val = 0
-            val = max(-32000, min(32000, int(val)))
-            noise_data.append(int(val))
-        packed_data = struct.pack('h' * len(noise_data), *noise_data)
-        with wave.open(filename, 'w') as f:
-            f.setnchannels(1); f.setsampwidth(2); f.setframerate(framerate); f.writeframes(packed_data)
+        """音声ワーカー上で実行される (ノイズはここでは生成しない)"""
+        try:
+            with TRACE.phase("init_audio"):
+                pygame.mixer.init()
+                pygame.mixer.set_reserved(ALARM_CHANNEL + 3)
+        except Exception as e:
+            print(f"Audio init error: {e}")
+            return
+        self.noise_cache = NoiseCache()
+        self.call_in_ui(self.on_audio_ready)
+
+    def on_audio_ready(self):
+        self.audio_ready = True
+        channels = [pygame.mixer.Channel(ALARM_CHANNEL + 1), pygame.mixer.Channel(ALARM_CHANNEL + 2)]
+        self.bgm = BgmEngine(channels, after=self.after, volume=self.vol_slider.get())
+        if self.timer_running: self.play_bgm()
 
     def init_db(self):
-        self.conn = sqlite3.connect("work_log.db")
-        self.cursor = self.conn.cursor()
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                duration_minutes INTEGER,
-                task_name TEXT,
-                time_range TEXT
-            )
-        """)
-        try: self.cursor.execute("SELECT task_name FROM logs LIMIT 1")
-        except: self.cursor.execute("ALTER TABLE logs ADD COLUMN task_name TEXT"); self.conn.commit()
-        try: self.cursor.execute("SELECT time_range FROM logs LIMIT 1")
-        except: self.cursor.execute("ALTER TABLE logs ADD COLUMN time_range TEXT"); self.conn.commit()
-        self.conn.commit()
+        self.store = LogStore("work_log.db", dispatch=self.call_in_ui)
+
+    def on_close(self):
+        """終了時にDBの書き込みキューを吐き出してから閉じる"""
+        self.store.close()
+        if DIAG.enabled: DIAG.dump()
+        self.notifier.close()
+        self.audio_executor.shutdown(wait=False)
+        self.destroy()
+
+    # --- 診断 (--diag) ---
+    LAG_PROBE_MS = 100
+
+    def probe_loop_lag(self, due):
+        """LAG_PROBE_MS ごとに起こしてもらい、予定時刻からの遅れをイベントループの遅れとして記録する"""
+        now = time.perf_counter()
+        DIAG.record("lag.loop", now - due)
+        self.after(self.LAG_PROBE_MS, self.probe_loop_lag, now + self.LAG_PROBE_MS / 1000)
+
+    def toggle_diagnostics(self, event=None):
+        """Ctrl+Shift+D で診断パネルを開閉する"""
+        if self.diag_window is not None and self.diag_window.winfo_exists():
+            self.diag_window.destroy()
+            self.diag_window = None
+            return
+        self.diag_window = ctk.CTkToplevel(self)
+        self.diag_window.title("Diagnostics")
+        self.diag_window.geometry("520x420")
+        self.diag_text = ctk.CTkTextbox(self.diag_window, font=("Consolas", 11), wrap="none")
+        self.diag_text.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+        self.diag_status_label = ctk.CTkLabel(self.diag_window, text="", font=("Yu Gothic UI", 10), text_color="gray")
+        self.diag_status_label.pack(side="left", padx=10, pady=(0, 10))
+        ctk.CTkButton(self.diag_window, text="JSON保存", width=90, command=self.dump_diagnostics).pack(side="right", padx=10, pady=(0, 10))
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if self.diag_window is None or not self.diag_window.winfo_exists(): return
+        self.diag_text.delete("1.0", "end")
+        self.diag_text.insert("1.0", DIAG.format())
+        self.after(1000, self.refresh_diagnostics)
+
+    def dump_diagnostics(self):
+        try: self.diag_status_label.configure(text=f"保存しました: {DIAG.dump()}")
+        except OSError as e: self.diag_status_label.configure(text=f"保存に失敗しました: {e}")
 
     # --- UI構築 ---
 
@@ -131,6 +2373,8 @@ class PomodoroApp(ctk.CTk):
         self.tabview.pack(padx=10, pady=5, fill="both", expand=True)
         self.tabview.add("Timer")
         self.tabview.add("History")
+        self.tabview.add("Stats")
+        self.tabview.configure(command=self.on_tab_change)
 
         t_frame = self.tabview.tab("Timer")
         ctk.CTkLabel(t_frame, text="作業内容 (Task Name)", font=("Yu Gothic UI", 12)).pack(pady=(5, 0))
@@ -148,6 +2392,10 @@ class PomodoroApp(ctk.CTk):
         self.task_entry._entry.bind("<FocusIn>", self.on_entry_focus_in, add="+")
         self.task_entry._entry.bind("<FocusOut>", self.on_entry_focus_out, add="+")
         self.task_entry._entry.bind("<Return>", self.on_entry_return, add="+")
+        self.task_entry._entry.bind("<KeyPress>", self.on_entry_key, add="+")
+        # IMEで変換中 (未確定文字あり) は補完しない。この仮想イベントを出さない環境では keycode 229 で判定する
+        self.task_entry._entry.bind("<<TkStartIMEMarkedText>>", lambda e: setattr(self, "ime_composing", True), add="+")
+        self.task_entry._entry.bind("<<TkEndIMEMarkedText>>", lambda e: setattr(self, "ime_composing", False), add="+")
 
         self.mode_var = ctk.StringVar(value="Focus 25")
         self.mode_segment = ctk.CTkSegmentedButton(t_frame, values=["Focus 25", "Focus 50", "Break 5", "Break 15"], command=self.change_mode, variable=self.mode_var)
@@ -166,6 +2414,8 @@ class PomodoroApp(ctk.CTk):
         self.vol_slider = ctk.CTkSlider(bgm_frame, from_=0, to=1, width=80, command=self.change_volume)
         self.vol_slider.set(0.5)
         self.vol_slider.pack(side="left", padx=5)
+        self.bgm_status_label = ctk.CTkLabel(bgm_frame, text="", font=("Yu Gothic UI", 10), text_color="gray", width=50)
+        self.bgm_status_label.pack(side="left", padx=2)
 
         btn_frame = ctk.CTkFrame(t_frame, fg_color="transparent")
         btn_frame.pack(pady=10)
@@ -190,13 +2440,43 @@ class PomodoroApp(ctk.CTk):
         self.status_label.pack(side="bottom", pady=5)
 
         h_frame = self.tabview.tab("History")
-        ctk.CTkLabel(h_frame, text="作業履歴", font=("Yu Gothic UI", 16, "bold")).pack(pady=10)
-        self.history_scroll = ctk.CTkScrollableFrame(h_frame, width=320, height=350)
-        self.history_scroll.pack()
+        ctk.CTkLabel(h_frame, text="作業履歴", font=("Yu Gothic UI", 16, "bold")).pack(pady=(10, 5))
+        search_frame = ctk.CTkFrame(h_frame, fg_color="transparent")
+        search_frame.pack(pady=(0, 5))
+        self.search_entry = ctk.CTkEntry(search_frame, placeholder_text="🔍 タスク名で検索", width=240, font=("Yu Gothic UI", 12))
+        self.search_entry.pack(side="left", padx=5)
+        self.search_entry._entry.bind("<KeyRelease>", self.on_search_key, add="+")
+        self.search_status_label = ctk.CTkLabel(search_frame, text="", font=("Yu Gothic UI", 10), text_color="gray", width=60)
+        self.search_status_label.pack(side="left")
+        self.history_model = HistoryModel(self.fetch_history_page, self.count_history)
+        self.history_view = HistoryView(h_frame, self.history_model)
+        self.history_view.pack()
         self.export_btn = ctk.CTkButton(h_frame, text="CSV出力 (Excel用)", command=self.export_csv, fg_color="green", hover_color="darkgreen")
-        self.export_btn.pack(pady=10)
-        ctk.CTkButton(h_frame, text="履歴更新", command=self.load_history, height=30).pack(pady=5)
-        self.load_history()
+        self.export_btn.pack(pady=(10, 0))
+        self.archive_btn = ctk.CTkButton(h_frame, text="アーカイブ出力 (履歴は保持)", command=self.export_archive, fg_color="teal")
+        self.archive_btn.pack(pady=5)
+        history_btn_frame = ctk.CTkFrame(h_frame, fg_color="transparent")
+        history_btn_frame.pack(pady=5)
+        self.import_btn = ctk.CTkButton(history_btn_frame, text="CSV取り込み", command=self.import_csv, height=30, width=150, fg_color="#4B4B4B")
+        self.import_btn.pack(side="left", padx=5)
+        ctk.CTkButton(history_btn_frame, text="履歴更新", command=self.load_history, height=30, width=100).pack(side="left", padx=5)
+
+        s_frame = self.tabview.tab("Stats")
+        ctk.CTkLabel(s_frame, text="集中時間の統計", font=("Yu Gothic UI", 16, "bold")).pack(pady=10)
+        totals_frame = ctk.CTkFrame(s_frame)
+        totals_frame.pack(fill="x", padx=20, pady=5)
+        self.stats_labels = {}
+        for row, (key, caption) in enumerate([("today", "今日"), ("week", "今週"), ("month", "今月"), ("total", "累計"), ("streak", "連続日数")]):
+            ctk.CTkLabel(totals_frame, text=caption, font=("Yu Gothic UI", 12), anchor="w").grid(row=row, column=0, sticky="w", padx=10, pady=2)
+            self.stats_labels[key] = ctk.CTkLabel(totals_frame, text="-", font=("Arial", 12, "bold"), text_color="#3B8ED0", anchor="e")
+            self.stats_labels[key].grid(row=row, column=1, sticky="e", padx=10, pady=2)
+        totals_frame.grid_columnconfigure(1, weight=1)
+        ctk.CTkLabel(s_frame, text="今週のトップタスク", font=("Yu Gothic UI", 12, "bold")).pack(pady=(15, 5))
+        self.top_task_labels = []
+        for _ in range(5):
+            label = ctk.CTkLabel(s_frame, text="", font=("Yu Gothic UI", 12), anchor="w")
+            label.pack(fill="x", padx=30)
+            self.top_task_labels.append(label)
 
     # --- 最前面制御ロジック ---
     def check_topmost(self):
@@ -224,6 +2504,24 @@ class PomodoroApp(ctk.CTk):
     def on_entry_return(self, event):
         self.focus() 
 
+    IME_PROCESS_KEYCODE = 229  # Windows: IMEが処理中のキー (VK_PROCESSKEY)
+
+    def on_entry_key(self, event):
+        """文字キーが押されたら、Entry に文字が入った後で補完する"""
+        if not event.char or not event.char.isprintable() or self.ime_composing or event.keycode == self.IME_PROCESS_KEYCODE: return
+        self.after_idle(self.complete_task_entry)
+
+    def complete_task_entry(self):
+        """入力中のタスク名を、最近よく使う名前で補完する (足した部分だけ選択状態にし、打ち続ければ上書きされる)"""
+        entry = self.task_entry._entry
+        if self.ime_composing or entry.index("insert") != entry.index("end") or entry.selection_present(): return
+        prefix = entry.get()
+        match = self.task_completer.complete(prefix)
+        if match is None or not match.startswith(prefix) or match == prefix: return
+        entry.insert("end", match[len(prefix):])
+        entry.select_range(len(prefix), "end")
+        entry.icursor(len(prefix))
+
     # --- レイアウト作成 (Mini/Bar) ---
     def create_mini_layout(self):
         self.mini_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -246,6 +2544,7 @@ class PomodoroApp(ctk.CTk):
         for widget in [self.bar_frame, inner_frame]:
             widget.bind("<Button-1>", self.start_move)
             widget.bind("<B1-Motion>", self.do_move)
+            widget.bind("<ButtonRelease-1>", self.end_move)
 
         self.bar_task_label = ctk.CTkLabel(inner_frame, text="No Task", font=("Yu Gothic UI", 12), text_color="gray")
         self.bar_task_label.pack(side="left", padx=10)
@@ -262,44 +2561,99 @@ class PomodoroApp(ctk.CTk):
             if isinstance(widget, ctk.CTkLabel):
                 widget.bind("<Button-1>", self.start_move)
                 widget.bind("<B1-Motion>", self.do_move)
+                widget.bind("<ButtonRelease-1>", self.end_move)
 
     def start_move(self, event):
-        self.drag_start_x = event.x
-        self.drag_start_y = event.y
+        self.drag.start(event)
 
     def do_move(self, event):
-        x = self.winfo_x() + (event.x - self.drag_start_x)
-        y = self.winfo_y() + (event.y - self.drag_start_y)
-        self.geometry(f"+{x}+{y}")
+        self.drag.move(event)
+
+    def end_move(self, event):
+        self.drag.release(event)
+
+    # --- 描画スケジューラ ---
+    def active_labels(self):
+        """表示中のビューの (時計ラベル, 時計の桁数, タイマーラベル)"""
+        if self.view_mode == "mini": return self.mini_clock_label, 8, self.mini_time_label
+        if self.view_mode == "bar": return self.bar_clock_label, 5, self.bar_time_label
+        return self.clock_label, 8, self.time_label
+
+    def tick(self):
+        """時計とタイマーをまとめて更新する唯一の定期処理"""
+        self.timer_id = None
+        if self.tick_due is not None: DIAG.record("lag.tick", time.perf_counter() - self.tick_due)
+        if self.timer_running: self.count_down()
+        self.update_clock()
+        self.schedule_tick()
+
+    def schedule_tick(self):
+        if self.timer_id: self.after_cancel(self.timer_id)
+        if self.timer_running:
+            # タイマー動作中はタイマーの表示境界に合わせ、時計も同じ tick で更新する
+            delay = self.engine.next_boundary()
+        else:
+            delay = 1 - (time.time() % 1)
+        self.timer_id = self.after(int(delay * 1000) + 1, self.tick)
+        if DIAG.enabled: self.tick_due = time.perf_counter() + (int(delay * 1000) + 1) / 1000
+
+    def refresh_view(self):
+        """ビュー切替時に、非表示の間に更新していなかったラベルへ現在値を反映する"""
+        clock_label, _, time_label = self.active_labels()
+        self.renderer.invalidate(clock_label, time_label)
+        self.update_time_display()
+        self.update_clock()
+        self.apply_start_state()
+
+    def set_start_state(self, text, color):
+        self.start_state = (text, color)
+        self.apply_start_state()
+
+    def apply_start_state(self):
+        """開始ボタンの表示を表示中のビューにだけ反映する (Mini/Bar は色のみ)"""
+        text, color = self.start_state
+        if self.view_mode == "mini": self.renderer.set(self.mini_start_btn, fg_color=color)
+        elif self.view_mode == "bar": self.renderer.set(self.bar_start_btn, fg_color=color)
+        else: self.renderer.set(self.start_btn, text=text, fg_color=color)
 
     def update_clock(self):
+        clock_label, width, _ = self.active_labels()
         now_str = datetime.datetime.now().strftime("%H:%M:%S")
-        if hasattr(self, 'clock_label'): self.clock_label.configure(text=now_str)
-        if hasattr(self, 'mini_clock_label'): self.mini_clock_label.configure(text=now_str)
-        if hasattr(self, 'bar_clock_label'): self.bar_clock_label.configure(text=now_str[:5])
-        self.after(1000, self.update_clock)
+        self.renderer.set(clock_label, text=now_str[:width])
+
+    # --- ビュー管理 ---
+    def get_view(self, name):
+        """name のビューのフレームを返す。未作成ならここで作る"""
+        frame = self.views.get(name)
+        if frame is None:
+            with TRACE.phase(f"create_{name}_layout"):
+                self.view_builders[name]()
+            frame = self.views[name] = getattr(self, f"{name}_frame")
+        return frame
+
+    def show_view(self, name):
+        """name のビューだけを表示する。他のビューは pack_forget で止め、描画更新の対象からも外れる"""
+        frame = self.get_view(name)
+        for other, other_frame in self.views.items():
+            if other != name: other_frame.pack_forget()
+        frame.pack(fill="both", expand=True)
 
     def show_main_view(self):
-        self.mini_frame.pack_forget()
-        self.bar_frame.pack_forget()
-        self.main_frame.pack(fill="both", expand=True)
+        self.show_view("main")
 
     def switch_to_mini(self):
+        self.show_view("mini")
         self.view_mode = "mini"
-        self.main_frame.pack_forget()
-        self.bar_frame.pack_forget()
-        self.mini_frame.pack(fill="both", expand=True)
         self.withdraw()
         self.overrideredirect(False)
         self.geometry("200x160")
         self.deiconify()
+        self.refresh_view()
         self.check_topmost() 
 
     def switch_to_bar(self):
+        self.show_view("bar")
         self.view_mode = "bar"
-        self.main_frame.pack_forget()
-        self.mini_frame.pack_forget()
-        self.bar_frame.pack(fill="both", expand=True)
         
         task = self.task_entry.get()
         # 【修正】文字数制限ロジック (10文字以上は省略)
@@ -318,6 +2672,7 @@ class PomodoroApp(ctk.CTk):
         self.geometry(f"{w}x{h}+{x}+{y}")
         self.deiconify()
         self.after(200, self.force_taskbar_icon)
+        self.refresh_view()
         self.check_topmost()
 
     def force_taskbar_icon(self):
@@ -336,15 +2691,14 @@ class PomodoroApp(ctk.CTk):
             print(f"Force taskbar icon error: {e}")
 
     def switch_to_main(self):
+        self.show_view("main")
         self.view_mode = "main"
-        self.mini_frame.pack_forget()
-        self.bar_frame.pack_forget()
-        self.main_frame.pack(fill="both", expand=True)
         self.overrideredirect(False)
         self.withdraw()
         self.update_idletasks()
         self.center_window(400, 700)
         self.deiconify()
+        self.refresh_view()
         self.check_topmost() 
 
     def center_window(self, w, h):
@@ -362,170 +2716,370 @@ class PomodoroApp(ctk.CTk):
             self.attributes('-topmost', state)
 
     def change_mode(self, value):
-        self.reset_timer()
         mapping = {"Focus 25": 25, "Focus 50": 50, "Break 5": 5, "Break 15": 15}
         self.selected_duration = mapping[value] * 60
-        self.timer_seconds = self.selected_duration
-        self.update_time_display()
+        self.reset_timer()  # 新しい長さでリセットする (サービスへの reset もこの1回だけ)
 
     def update_time_display(self):
         mins, secs = divmod(self.timer_seconds, 60)
         time_text = f"{mins:02d}:{secs:02d}"
-        self.time_label.configure(text=time_text)
-        self.mini_time_label.configure(text=time_text)
-        if hasattr(self, 'bar_time_label'): self.bar_time_label.configure(text=time_text)
+        _, _, time_label = self.active_labels()
+        self.renderer.set(time_label, text=time_text)
         mode_name = "Work" if "Focus" in self.mode_var.get() else "Break"
-        self.title(f"{time_text} - {mode_name}")
+        title = f"{time_text} - {mode_name}"
+        if title != self.window_title:
+            self.window_title = title
+            self.title(title)
 
     def start_timer(self):
         if not self.timer_running:
             if self.timer_seconds == 0:
+                self.engine.reset(self.selected_duration)
                 self.timer_seconds = self.selected_duration
                 self.update_time_display()
             self.timer_running = True
-            self.start_btn.configure(text="PAUSE", fg_color="orange")
-            self.mini_start_btn.configure(fg_color="orange")
-            if hasattr(self, 'bar_start_btn'): self.bar_start_btn.configure(fg_color="orange")
+            self.engine.start()
+            self.notifier.cancel()
+            self.ensure_audio()
+            self.set_start_state("PAUSE", "orange")
+            self.remote("start", minutes=self.selected_duration // 60, mode="focus" if "Focus" in self.mode_var.get() else "break", task=self.task_entry.get())
             self.status_label.configure(text="Concentrating...", text_color="#3B8ED0")
             self.play_bgm()
             self.count_down()
+            self.schedule_tick()
         else:
             self.pause_timer()
 
     def pause_timer(self):
+        if self.timer_running: self.remote("pause")
         self.timer_running = False
-        self.start_btn.configure(text="RESUME", fg_color="#1f6aa5")
-        self.mini_start_btn.configure(fg_color="#1f6aa5")
-        if hasattr(self, 'bar_start_btn'): self.bar_start_btn.configure(fg_color="#1f6aa5")
+        self.engine.pause()
+        self.set_start_state("RESUME", "#1f6aa5")
         self.status_label.configure(text="Paused", text_color="orange")
-        self.stop_bgm()
-        if self.timer_id:
-            self.after_cancel(self.timer_id)
+        self.pause_bgm()
 
     def reset_timer(self):
         self.pause_timer()
+        self.engine.reset(self.selected_duration)
+        self.remote("reset", minutes=self.selected_duration // 60)
         self.timer_seconds = self.selected_duration
         self.update_time_display()
-        self.start_btn.configure(text="START", fg_color="#1f6aa5")
-        self.mini_start_btn.configure(fg_color="#1f6aa5")
-        if hasattr(self, 'bar_start_btn'): self.bar_start_btn.configure(fg_color="#1f6aa5")
+        self.set_start_state("START", "#1f6aa5")
         self.status_label.configure(text="Ready", text_color="gray")
         self.stop_bgm()
 
     def count_down(self):
-        if self.timer_running and self.timer_seconds > 0:
-            self.timer_seconds -= 1
-            self.update_time_display()
-            self.timer_id = self.after(1000, self.count_down)
-        elif self.timer_seconds == 0 and self.timer_running:
-            self.finish_timer()
+        if not self.timer_running: return
+        self.timer_seconds = self.engine.remaining_display()
+        self.update_time_display()
+        if self.engine.finished(): self.finish_timer()
 
     def finish_timer(self):
         self.timer_running = False
-        self.start_btn.configure(text="START", fg_color="#1f6aa5")
-        self.mini_start_btn.configure(fg_color="#1f6aa5")
-        if hasattr(self, 'bar_start_btn'): self.bar_start_btn.configure(fg_color="#1f6aa5")
+        self.engine.pause()
+        self.set_start_state("START", "#1f6aa5")
         self.status_label.configure(text="Finished!", text_color="green")
         self.stop_bgm()
-        threading.Thread(target=self.play_alarm_sound, daemon=True).start()
         self.send_notification()
         mode = self.mode_var.get()
         if "Focus" in mode:
-            duration = 25 if "25" in mode else 50
-            task_name = self.task_entry.get()
-            if not task_name: task_name = "名無しのタスク"
-            self.save_log(duration, task_name)
-            self.load_history()
+            if self.service:
+                # 記録はサービス側が書くので、書き終わる (logged が増える) のを確かめてから読み直す
+                self.wait_remote_log(self.remote_logged)
+            else:
+                duration = 25 if "25" in mode else 50
+                task_name = self.task_entry.get()
+                if not task_name: task_name = "名無しのタスク"
+                self.save_log(duration, task_name)
         self.attributes('-topmost', True)
 
+    # --- タイマーサービス連携 (--attach) ---
+    def remote(self, action, **payload):
+        """サービスに接続していれば操作を送り、返ってきた状態に手元の表示を合わせる"""
+        if self.service is None: return
+        self.service.send(action, callback=lambda status: self.call_in_ui(self.sync_remote, status), **payload)
+
+    REMOTE_LOG_POLL_MS = 500
+    REMOTE_LOG_POLLS = 20
+
+    def wait_remote_log(self, before, polls=REMOTE_LOG_POLLS):
+        """サービスの状態を問い合わせ、logged が before を超えたら履歴を読み直す (超えないまま polls 回で諦めて読む)"""
+        def check(status):
+            self.remote_logged = status.get("logged", 0)
+            if self.remote_logged > before or polls <= 1: self.load_history()
+            else: self.after(self.REMOTE_LOG_POLL_MS, lambda: self.wait_remote_log(before, polls - 1))
+        self.service.status(lambda status: self.call_in_ui(check, status))
+
+    def sync_remote(self, status):
+        self.remote_logged = status.get("logged", self.remote_logged)
+        self.engine.reset(status["duration"])
+        self.engine.elapsed = status["duration"] - status["remaining"]
+        if status["running"] and self.timer_running: self.engine.start()
+        self.timer_seconds = self.engine.remaining_display()
+        self.update_time_display()
+        self.schedule_tick()
+
     def on_bgm_change(self, choice):
-        if self.timer_running: self.stop_bgm(); self.play_bgm()
-    def change_volume(self, value): pygame.mixer.music.set_volume(value)
+        if choice == "None": self.stop_bgm()
+        elif self.timer_running: self.play_bgm()
+        else: self.prepare_bgm(choice)
+    def change_volume(self, value):
+        if self.audio_ready: self.bgm.set_volume(value)
+
+    def refresh_sounds(self):
+        """sounds/ の索引を音声ワーカーで更新する (連続したフォーカスでは2秒に1回まで)"""
+        now = time.monotonic()
+        if now - self.sound_refreshed < 2: return
+        self.sound_refreshed = now
+        future = self.audio_executor.submit(self.sound_library.refresh)
+        future.add_done_callback(lambda f: self.call_in_ui(self.on_sounds_refreshed, f))
+
+    def on_sounds_refreshed(self, future):
+        try: future.result()
+        except Exception as e:
+            print(f"Sound library error: {e}")
+            return
+        names = ["None"] + list(NOISE_BGM) + [n for n in self.sound_library.names() if n not in NOISE_BGM]
+        if names != self.bgm_menu.cget("values"): self.bgm_menu.configure(values=names)
+        for name in list(self.bgm_files):
+            if name not in NOISE_BGM and self.sound_library.path(name) != self.bgm_files[name]: del self.bgm_files[name]
+
+    def resolve_bgm_file(self, bgm_name):
+        """音声ワーカー上でBGMを用意し (デコードしてキャッシュに載せ) てパスを返す"""
+        if self.noise_cache is None: return None
+        if bgm_name in NOISE_BGM: filename = self.noise_cache.ensure(NOISE_BGM[bgm_name], duration=NOISE_DURATION)
+        else: filename = self.sound_library.path(bgm_name)
+        if filename is None: return None
+        self.sound_library.load(filename)
+        return filename
+
+    def prepare_bgm(self, bgm_name):
+        """BGMファイルを裏で準備する。準備中はラベルに表示"""
+        if bgm_name == "None" or bgm_name in self.bgm_pending: return
+        filename = self.bgm_files.get(bgm_name)
+        if filename is not None and self.sound_library.get(filename) is not None: return
+        self.ensure_audio()
+        self.bgm_pending.add(bgm_name)
+        self.bgm_status_label.configure(text="準備中…")
+        future = self.audio_executor.submit(self.resolve_bgm_file, bgm_name)
+        future.add_done_callback(lambda f: self.call_in_ui(self.on_bgm_prepared, bgm_name, f))
+
+    def on_bgm_prepared(self, bgm_name, future):
+        self.bgm_pending.discard(bgm_name)
+        if not self.bgm_pending: self.bgm_status_label.configure(text="")
+        try: filename = future.result()
+        except Exception as e:
+            print(f"BGM prepare error: {e}")
+            filename = None
+        if filename is None: return
+        self.bgm_files[bgm_name] = filename
+        if self.timer_running and self.bgm_var.get() == bgm_name: self.play_bgm()
+
     def play_bgm(self):
         bgm_name = self.bgm_var.get()
         if bgm_name == "None": return
-        filename = ""
-        if "White Noise" in bgm_name: filename = "white_noise.wav"
-        elif "Pink Noise" in bgm_name: filename = "pink_noise.wav"
-        elif "Brown Noise" in bgm_name: filename = "brown_noise.wav"
-        else:
-            if not os.path.exists("sounds"):
-                try: os.makedirs("sounds")
-                except: pass
-            filename = f"sounds/{bgm_name}.mp3"
-        if os.path.exists(filename):
-            try:
-                pygame.mixer.music.load(filename)
-                pygame.mixer.music.set_volume(self.vol_slider.get())
-                pygame.mixer.music.play(-1)
-            except: pass
+        filename = self.bgm_files.get(bgm_name)
+        # デコード済みの Sound がキャッシュにあるときだけ鳴らす。なければ裏で用意してから
+        sound = self.sound_library.get(filename) if filename and self.audio_ready else None
+        if sound is None:
+            self.prepare_bgm(bgm_name)
+            return
+        try: self.bgm.play(sound)
+        except Exception as e: print(f"BGM play error: {e}")
+    def pause_bgm(self):
+        if self.audio_ready: self.bgm.pause()
     def stop_bgm(self):
-        try: pygame.mixer.music.stop()
-        except: pass
-    def play_alarm_sound(self):
-        for _ in range(3): winsound.Beep(1000, 200); time.sleep(0.1); winsound.Beep(1000, 200); time.sleep(0.1); winsound.Beep(1000, 200); time.sleep(0.8)
+        if not self.audio_ready: return
+        try: self.bgm.stop()
+        except Exception: pass
     def send_notification(self):
         mode = self.mode_var.get()
         msg = "お疲れ様でした！休憩しましょう。" if "Focus" in mode else "休憩終了！作業に戻りましょう。"
-        try: Notification(app_id="Pomodoro Timer", title="タイマー終了", msg=msg, duration="long").show()
-        except: pass
+        self.notifier.post("タイマー終了", msg)
     def save_log(self, minutes, task_name):
-        now = datetime.datetime.now()
-        end = now.strftime("%H:%M"); start = (now - datetime.timedelta(minutes=minutes)).strftime("%H:%M")
-        self.cursor.execute("INSERT INTO logs (date, duration_minutes, task_name, time_range) VALUES (?, ?, ?, ?)", (datetime.date.today().strftime("%Y-%m-%d"), minutes, task_name, f"{start} - {end}")); self.conn.commit()
+        end_ts = int(time.time())
+        return self.store.insert_log(end_ts - minutes * 60, end_ts, minutes, task_name, callback=self.on_log_saved)
+    def on_log_saved(self, row):
+        self.task_completer.add(row[4])
+        if self.search_text: self.history_view.reset()
+        else: self.history_view.prepend(row)
+        if self.tabview.get() == "Stats": self.load_stats()
+    def fetch_history_page(self, before_id, offset, limit, callback):
+        text = self.search_text
+        if text: self.store.read(lambda conn: TaskSearch.page(conn, text, before_id, offset, limit), callback)
+        else: self.store.read(lambda conn: conn.execute(f"SELECT {LOG_COLUMNS} FROM logs WHERE id < ? ORDER BY id DESC LIMIT ? OFFSET ?", (before_id, limit, offset)).fetchall(), callback)
+    def count_history(self, callback):
+        text = self.search_text
+        if text: self.store.read(lambda conn: TaskSearch.count(conn, text), lambda result: self.on_search_counted(text, result, callback), self.on_history_error)
+        else: self.store.read(lambda conn: conn.execute("SELECT COUNT(*), MAX(id) FROM logs").fetchone(), callback, self.on_history_error)
+    def on_history_error(self, e):
+        self.search_status_label.configure(text="読込エラー", text_color="red")
     def load_history(self):
-        for w in self.history_scroll.winfo_children(): w.destroy()
-        self.cursor.execute("SELECT date, duration_minutes, task_name, time_range FROM logs ORDER BY id DESC LIMIT 50")
-        rows = self.cursor.fetchall()
-        if not rows: ctk.CTkLabel(self.history_scroll, text="履歴なし").pack(pady=10); return
-        for date_str, mins, task, time_rng in rows:
-            f = ctk.CTkFrame(self.history_scroll)
-            f.pack(fill="x", pady=2, padx=5)
-            date_disp = f"{date_str[5:]} {time_rng if time_rng else ''}"
-            ctk.CTkLabel(f, text=date_disp, font=("Yu Gothic UI", 10), width=110, anchor="w").pack(side="left", padx=5)
-            ctk.CTkLabel(f, text=task if task else "-", font=("Yu Gothic UI", 12), anchor="w").pack(side="left", padx=5, fill="x", expand=True)
-            ctk.CTkLabel(f, text=f"{mins}分", font=("Arial", 12, "bold"), text_color="#3B8ED0").pack(side="right", padx=5)
+        self.history_view.reset()
+        self.store.read(TaskCompleter.recent_counts, self.task_completer.load)
+
+    def on_search_key(self, event):
+        """入力が止まって 250ms 後に検索する"""
+        if self.search_after: self.after_cancel(self.search_after)
+        self.search_after = self.after(250, self.run_search)
+
+    def run_search(self):
+        self.search_after = None
+        text = self.search_entry.get().strip()
+        if text == self.search_text: return
+        self.search_text = text
+        self.history_model.keyset = not text  # 検索結果は関連度順
+        if not text: self.search_status_label.configure(text="")
+        self.history_view.reset()
+
+    def on_search_counted(self, text, result, callback):
+        if text == self.search_text: self.search_status_label.configure(text=f"{result[0]}件")
+        callback(result)
+
+    def on_tab_change(self):
+        if self.tabview.get() == "Stats": self.load_stats()
+    def load_stats(self):
+        self.store.read(StatsRollup.summary, callback=self.show_stats)
+    def show_stats(self, summary):
+        def fmt(sessions, minutes): return f"{minutes // 60}時間{minutes % 60:02d}分 ({sessions}回)"
+        for key in ("today", "week", "month", "total"):
+            self.stats_labels[key].configure(text=fmt(*summary[key]))
+        self.stats_labels["streak"].configure(text=f"{summary['streak']}日")
+        for i, label in enumerate(self.top_task_labels):
+            if i < len(summary["top_tasks"]):
+                task, minutes = summary["top_tasks"][i]
+                label.configure(text=f"{i + 1}. {task}  {minutes}分")
+            else:
+                label.configure(text="")
 
     def export_csv(self):
-        try:
-            self.cursor.execute("SELECT id, date, duration_minutes, task_name, time_range FROM logs")
-            rows = self.cursor.fetchall()
-            
-            if not rows:
-                self.export_btn.configure(text="データなし", fg_color="gray")
-                self.after(2000, lambda: self.export_btn.configure(text="CSV出力 (Excel用)", fg_color="green"))
-                return
-
-            export_dir = "exports"
-            if not os.path.exists(export_dir):
-                os.makedirs(export_dir)
-
-            data_by_date = {}
-            for row in rows:
-                date_key = row[1]
-                if date_key not in data_by_date:
-                    data_by_date[date_key] = []
-                data_by_date[date_key].append(row)
-
-            for date_key, day_rows in data_by_date.items():
-                filename = f"{export_dir}/{date_key}.csv"
-                file_exists = os.path.isfile(filename)
-                with open(filename, "a", newline="", encoding="utf-8_sig") as f:
-                    writer = csv.writer(f)
-                    if not file_exists:
-                        writer.writerow(["ID", "Date", "Minutes", "Task Name", "Time Range"])
-                    writer.writerows(day_rows)
-            
-            self.cursor.execute("DELETE FROM logs")
-            self.conn.commit()
+        self.export_btn.configure(text="出力中…", fg_color="gray", state="disabled")
+        exporter = CsvExporter()
+        progress = lambda done, total: self.call_in_ui(self.on_export_progress, done, total)
+        self.store.task(lambda conn: exporter.run(conn, progress), callback=self.on_export_done, errback=self.on_export_error)
+
+    def export_archive(self):
+        self.archive_btn.configure(text="アーカイブ中…", state="disabled")
+        archiver = ArchiveExporter()
+        progress = lambda done, total: self.call_in_ui(self.on_archive_progress, done, total)
+        self.store.task(lambda conn: archiver.run(conn, progress), callback=self.on_archive_done, errback=self.on_archive_error)
+
+    def on_archive_progress(self, done, total):
+        self.archive_btn.configure(text=f"アーカイブ中… {done * 100 // total}%")
+
+    def on_archive_done(self, count):
+        self.archive_btn.configure(text=f"{count}件をアーカイブ" if count else "新しい履歴なし", state="normal")
+        self.after(3000, lambda: self.archive_btn.configure(text="アーカイブ出力 (履歴は保持)"))
+
+    def on_archive_error(self, e):
+        self.archive_btn.configure(text="エラー発生", fg_color="red", state="normal")
+
+    def on_export_progress(self, done, total):
+        self.export_btn.configure(text=f"出力中… {done * 100 // total}%")
+
+    def on_export_done(self, count):
+        self.export_btn.configure(state="normal")
+        if not count:
+            self.load_history()  # 取り込み直した行だけだった場合も削除はされている
+            self.export_btn.configure(text="データなし", fg_color="gray")
+            self.after(2000, lambda: self.export_btn.configure(text="CSV出力 (Excel用)", fg_color="green"))
+            return
+        self.load_history()
+        self.export_btn.configure(text="出力＆履歴クリア完了", fg_color="gray")
+        self.after(3000, lambda: self.export_btn.configure(text="CSV出力 (Excel用)", fg_color="green"))
+
+    def on_export_error(self, e):
+        self.export_btn.configure(text="エラー発生", fg_color="red", state="normal")
+
+    def import_csv(self):
+        """exports フォルダのCSVを履歴に読み戻す (取り込み済みの ID は飛ばす)"""
+        self.import_btn.configure(text="取り込み中…", state="disabled")
+        importer = CsvImporter("exports")
+        progress = lambda done, total: self.call_in_ui(self.on_import_progress, done, total)
+        # 解析 (とプロセスプール) は LogStore のワーカーではなく専用スレッドで回し、書き込みだけを LogStore に渡す
+        def work():
+            try: summary = importer.run(self.store, progress)
+            except Exception as e: self.call_in_ui(self.on_import_error, e)
+            else: self.call_in_ui(self.on_import_done, summary)
+        threading.Thread(target=work, name="csv-import", daemon=True).start()
+
+    def on_import_progress(self, done, total):
+        self.import_btn.configure(text=f"取り込み中… {done * 100 // total}%")
+
+    def on_import_done(self, summary):
+        for failed in summary["failed_files"]: print(f"CSV import skipped {failed}")
+        text = f"追加{summary['inserted']} / 重複{summary['skipped']}"
+        if summary["malformed"] or summary["failed_files"]: text += f" / 不正{summary['malformed'] + len(summary['failed_files'])}"
+        self.import_btn.configure(text=text, state="normal")
+        self.after(4000, lambda: self.import_btn.configure(text="CSV取り込み"))
+        if summary["inserted"]:
             self.load_history()
-            self.export_btn.configure(text="出力＆履歴クリア完了", fg_color="gray")
-            self.after(3000, lambda: self.export_btn.configure(text="CSV出力 (Excel用)", fg_color="green"))
-            
-        except Exception as e:
-            print(e)
-            self.export_btn.configure(text="エラー発生", fg_color="red")
+            if self.tabview.get() == "Stats": self.load_stats()
+
+    def on_import_error(self, e):
+        self.import_btn.configure(text="エラー発生", fg_color="red", state="normal")
+
+def import_csv_files(paths, db_path="work_log.db"):
+    """--import-csv: GUIなしでCSVを取り込み、結果を表示する"""
+    store = LogStore(db_path)
+    try:
+        start = time.perf_counter()
+        summary = CsvImporter(paths).run(store)
+    finally:
+        store.close()
+    for failed in summary["failed_files"]: print(f"skipped {failed}", file=sys.stderr)
+    print(f"{summary['files']} files: {summary['inserted']} inserted, {summary['skipped']} skipped (duplicate ID), "
+          f"{summary['malformed']} malformed rows, {len(summary['failed_files'])} unreadable files ({time.perf_counter() - start:.2f}s)")
+
+def archive_maintenance(action, file=None, db_path="work_log.db", archive_dir="archive"):
+    """--archive-verify / --archive-reimport / --archive-reexport: GUIなしでアーカイブを点検・復元し、終了コードを返す"""
+    archiver = ArchiveExporter(archive_dir)
+    if action == "verify":
+        problems = archiver.verify(deep=True)
+        for name, problem in problems: print(f"{name}: {problem}", file=sys.stderr)
+        print(f"{len(archiver.load_manifest()['segments'])} segments, {len(problems)} problems")
+        return 1 if problems else 0
+    store = LogStore(db_path)
+    try:
+        if action == "reimport":
+            inserted, skipped = store.task(archiver.reimport).result()
+            print(f"{inserted} inserted, {skipped} already in the database")
+        else:
+            entry = store.task(lambda conn: archiver.reexport(conn, file)).result()
+            print(f"rewrote {entry['file']} ({entry['rows']} rows)")
+    finally:
+        store.close()
+    return 0
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Modern Pomodoro Timer")
+    parser.add_argument("--serve", action="store_true", help="GUIなしでタイマーサービスを起動する")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--attach", metavar="URL", help="起動中のタイマーサービスに接続する (例: http://127.0.0.1:8765)")
+    parser.add_argument("--timer-id", default="desk", help="--attach 時に使うタイマー名")
+    parser.add_argument("--trace-startup", action="store_true", help="起動時間の内訳を startup_trace.json に出力する")
+    parser.add_argument("--import-csv", nargs="+", metavar="PATH", help="エクスポートしたCSV (ファイルかフォルダ) を履歴に取り込んで終了する")
+    parser.add_argument("--archive-verify", action="store_true", help="archive/ のセグメントを manifest と照合する (件数・id範囲も数え直す)")
+    parser.add_argument("--archive-reimport", action="store_true", help="archive/ から履歴DBに欠けている行を読み戻して終了する")
+    parser.add_argument("--archive-reexport", metavar="FILE", help="manifest 上のセグメント FILE を履歴DBの行から作り直して終了する")
+    parser.add_argument("--diag", action="store_true", help="処理時間の計測を有効にする (Ctrl+Shift+D で診断パネル、終了時に diagnostics.json)")
+    args = parser.parse_args(argv)
+    if args.serve:
+        run_service(args.host, args.port)
+        return
+    if args.import_csv:
+        import_csv_files(args.import_csv)
+        return
+    if args.archive_verify: sys.exit(archive_maintenance("verify"))
+    if args.archive_reimport: sys.exit(archive_maintenance("reimport"))
+    if args.archive_reexport: sys.exit(archive_maintenance("reexport", args.archive_reexport))
+    app = PomodoroApp(service=ServiceClient(args.attach, args.timer_id) if args.attach else None)
+    app.mainloop()
 
 if __name__ == "__main__":
-    app = PomodoroApp()
-    app.mainloop()
\ No newline at end of file
+    # exe化したときに CSV取り込みのプロセスプールが自分自身を起動し直さないようにする
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
\ No newline at end of file
@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("POMODORO_NOTIFY", "none")
+
+# Windows専用モジュールと GUI は計測スクリプトと同じ代用品で済ませる (ディスプレイなしでも動かすため)
+import benchmark
+benchmark.install_fakes(stub_gui=True)
+
+import pomodoro
+
+
+class FakeClock:
+    """time.monotonic の代わり。now を書き換えて時間を進める"""
+
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def conn():
+    """スキーマ移行済みのメモリ上のDB"""
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    pomodoro.SchemaMigrations.apply(conn)
+    yield conn
+    conn.close()
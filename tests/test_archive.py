@@ -0,0 +1,70 @@
+import gzip
+import os
+
+import pytest
+
+import pomodoro
+
+
+@pytest.fixture
+def logs(conn):
+    start = 1792260720
+    rows = [(start + i * 86400 * 10, start + i * 86400 * 10 + 1500, 25, f"タスク{i % 3}") for i in range(12)]
+    for start_ts, end_ts, minutes, task in rows:
+        date, time_range = pomodoro.log_period(start_ts, end_ts)
+        conn.execute("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, ?, ?, ?, ?)",
+                     (start_ts, end_ts, minutes, task, date, time_range))
+    return conn
+
+
+def all_rows(conn):
+    return conn.execute(f"SELECT {pomodoro.LOG_COLUMNS} FROM logs ORDER BY id").fetchall()
+
+
+def test_run_verify_reimport_round_trip(logs, tmp_path):
+    archiver = pomodoro.ArchiveExporter(str(tmp_path / "archive"), batch_size=5)
+    before = all_rows(logs)
+    assert archiver.run(logs) == 12
+    assert archiver.run(logs) == 0
+    manifest = archiver.load_manifest()
+    assert manifest["last_id"] == 12 and sum(entry["rows"] for entry in manifest["segments"]) == 12
+    assert archiver.verify(deep=True) == []
+
+    logs.execute("DELETE FROM logs WHERE id > 4")
+    assert archiver.reimport(logs) == (8, 4)
+    assert all_rows(logs) == before
+    assert archiver.reimport(logs) == (0, 12)
+
+
+def test_verify_detects_damage_and_reexport_repairs(logs, tmp_path):
+    archiver = pomodoro.ArchiveExporter(str(tmp_path / "archive"))
+    archiver.run(logs)
+    entry = archiver.load_manifest()["segments"][0]
+    with gzip.open(os.path.join(archiver.archive_dir, entry["file"]), "wt", encoding="utf-8") as f: f.write("broken\n")
+    assert archiver.verify() == [(entry["file"], "hash mismatch")]
+    archiver.reexport(logs, entry["file"])
+    assert archiver.verify(deep=True) == []
+
+
+def test_cli_verify_exit_code(logs, tmp_path, capsys):
+    archiver = pomodoro.ArchiveExporter(str(tmp_path / "archive"))
+    archiver.run(logs)
+    assert pomodoro.archive_maintenance("verify", archive_dir=archiver.archive_dir) == 0
+    os.remove(os.path.join(archiver.archive_dir, archiver.load_manifest()["segments"][0]["file"]))
+    assert pomodoro.archive_maintenance("verify", archive_dir=archiver.archive_dir) == 1
+    assert "missing" in capsys.readouterr().err
+
+
+def test_parquet_schema_survives_null_timestamps(conn, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    conn.executemany("INSERT INTO logs (date, duration_minutes, task_name, time_range) VALUES ('2026-10-18', 25, '読書', ?)", [("壊れた値",)] * 3)
+    conn.execute("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (1792260720, 1792262220, 25, '読書', '2026-10-18', '02:12 - 02:37')")
+    archiver = pomodoro.ArchiveExporter(str(tmp_path / "archive"), batch_size=3)
+    assert archiver.columnar
+    archiver.run(conn)
+    (entry,) = archiver.load_manifest()["segments"]
+    parquet = [f for f in os.listdir(os.path.join(archiver.archive_dir, entry["month"])) if f.endswith(".parquet")]
+    table = pq.read_table(os.path.join(archiver.archive_dir, entry["month"], parquet[0]))
+    assert table.schema == pomodoro.ArchiveExporter.arrow_schema()
+    assert table.num_rows == 4
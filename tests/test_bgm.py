@@ -0,0 +1,121 @@
+import time
+
+import numpy as np
+import pytest
+
+import pomodoro
+
+
+class FakeChannel:
+    def __init__(self):
+        self.volume = 0.0
+        self.sound = None
+        self.paused = False
+
+    def set_volume(self, volume): self.volume = volume
+    def play(self, sound, loops=0): self.sound = sound
+    def stop(self): self.sound = None
+    def pause(self): self.paused = True
+    def unpause(self): self.paused = False
+
+
+class FakeTk:
+    """clock と after を兼ねる。run() で予約された処理を時刻順に進める"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []
+
+    def clock(self): return self.now
+    def after(self, ms, func): self.queue.append((self.now + ms / 1000, func))
+
+    def run(self, on_step=None):
+        while self.queue:
+            self.queue.sort(key=lambda item: item[0])
+            self.now, func = self.queue.pop(0)
+            func()
+            if on_step: on_step()
+
+
+def test_crossfade_gains_sum_to_volume():
+    tk = FakeTk()
+    channels = [FakeChannel(), FakeChannel()]
+    engine = pomodoro.BgmEngine(channels, tk.after, clock=tk.clock, volume=0.5)
+    engine.play("a")
+    tk.run()
+    a, b = channels[engine.active], channels[1 - engine.active]
+    assert (a.volume, b.volume) == (0.5, 0.0)
+
+    engine.play("b")
+    sums = []
+    tk.run(lambda: sums.append(a.volume + b.volume))
+    assert len(sums) >= engine.FADE_MS // engine.STEP_MS
+    assert sums == pytest.approx([0.5] * len(sums), abs=1e-9)
+    assert (a.volume, b.volume) == (0.0, 0.5)
+    assert (a.sound, b.sound) == (None, "b")
+
+
+def test_pause_fades_out_then_resumes_same_channel():
+    tk = FakeTk()
+    channels = [FakeChannel(), FakeChannel()]
+    engine = pomodoro.BgmEngine(channels, tk.after, clock=tk.clock, volume=0.5)
+    engine.play("a")
+    tk.run()
+    channel = channels[engine.active]
+    engine.pause()
+    tk.run()
+    assert (channel.volume, channel.paused) == (0.0, True)
+    engine.play("a")
+    tk.run()
+    assert (channel.volume, channel.paused, channel.sound) == (0.5, False, "a")
+
+
+@pytest.mark.parametrize("color", ["white", "pink", "brown"])
+def test_noise_loop_has_no_seam(color):
+    rate = pomodoro.NOISE_SAMPLE_RATE
+    duration, fade = 1, pomodoro.NOISE_LOOP_FADE
+    loop = pomodoro.NoiseSynth(color, seed=3).render_loop(duration, fade).astype(int)
+    straight = pomodoro.NoiseSynth(color, seed=3).render(duration + fade).astype(int)
+    n = duration * rate
+    assert len(loop) == n
+    # 継ぎ目 (末尾 -> 先頭) は、元の信号で続いていた2サンプルと同じ
+    assert (loop[-1], loop[0]) == (straight[n - 1], straight[n])
+    assert abs(loop[0] - loop[-1]) <= np.abs(np.diff(loop)).max()
+
+
+def test_switch_latency_on_dummy_mixer(tmp_path, record_property):
+    """ダミー音声ドライバ上の本物のミキサーで、曲の切り替えにかかる時間を測る"""
+    pygame = pomodoro.pygame
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        pytest.skip(f"mixer unavailable: {e}")
+    try:
+        pygame.mixer.set_reserved(pomodoro.ALARM_CHANNEL + 3)
+        sounds = []
+        for color in ("white", "pink", "brown"):
+            path = str(tmp_path / f"{color}.wav")
+            pomodoro.NoiseSynth(color, seed=0).write_wav(path, 1, loop_fade=pomodoro.NOISE_LOOP_FADE)
+            sounds.append(pygame.mixer.Sound(path))
+        tk = FakeTk()
+        engine = pomodoro.BgmEngine([pygame.mixer.Channel(1), pygame.mixer.Channel(2)], tk.after, clock=tk.clock)
+        latencies = []
+        for i in range(30):
+            start = time.perf_counter()
+            engine.play(sounds[i % 3])
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert engine.channels[engine.active].get_sound() is sounds[i % 3]
+            tk.run()
+        latencies.sort()
+        p50, p95 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+        record_property("bgm_switch_p50_ms", p50)
+        record_property("bgm_switch_p95_ms", p95)
+        print(f"BGM switch latency: p50 {p50:.3f} ms, p95 {p95:.3f} ms, max {latencies[-1]:.3f} ms")
+        # 切り替えはデコードもファイル読込もしないので、1フレーム (16ms) より十分短い
+        assert p95 < 5
+        assert engine.channels[engine.active].get_busy()
+        engine.stop()
+        tk.run()
+        assert not any(channel.get_busy() for channel in engine.channels)
+    finally:
+        pygame.mixer.quit()
@@ -0,0 +1,114 @@
+import csv
+import os
+
+import pomodoro
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f))[1:]
+
+
+def export(store, export_dir):
+    return store.task(pomodoro.CsvExporter(export_dir).run).result()
+
+
+def test_export_import_export_has_no_duplicates(tmp_path):
+    export_dir = str(tmp_path / "exports")
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    try:
+        start = 1792260720  # 2026-10-18 02:12 (JST)
+        store.insert_logs([(start, start + 25 * 60, 25, "英語の勉強"), (start + 3600, start + 3600 + 25 * 60, 25, "資料作成")]).result()
+        assert export(store, export_dir) == 2
+        (day_file,) = os.listdir(export_dir)
+        first = read_rows(os.path.join(export_dir, day_file))
+
+        summary = pomodoro.CsvImporter(export_dir).run(store)
+        assert summary["inserted"] == 2
+        store.insert_log(start + 7200, start + 7200 + 25 * 60, 25, "読書").result()
+        assert export(store, export_dir) == 1
+
+        rows = read_rows(os.path.join(export_dir, day_file))
+        assert rows[:2] == first
+        assert len(rows) == 3
+        assert len({row[0] for row in rows}) == 3
+        assert store.read(lambda conn: conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]).result() == 0
+    finally:
+        store.close()
+
+
+def test_import_skips_known_ids_and_counts_malformed(tmp_path):
+    export_dir = tmp_path / "exports"
+    export_dir.mkdir()
+    with open(export_dir / "2026-10-18.csv", "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(pomodoro.CsvExporter.HEADER)
+        writer.writerow([1, "2026-10-18", 25, "英語の勉強", "02:12 - 02:37"])
+        writer.writerow(["x", "2026-10-18", 25])
+    (export_dir / "notes.csv").write_text("a,b\n", encoding="utf-8")
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    try:
+        first = pomodoro.CsvImporter(str(export_dir)).run(store)
+        again = pomodoro.CsvImporter(str(export_dir)).run(store)
+    finally:
+        store.close()
+    assert (first["inserted"], first["malformed"], len(first["failed_files"])) == (1, 1, 1)
+    assert (again["inserted"], again["skipped"]) == (0, 1)
+
+
+def test_pool_keeps_file_order_with_bounded_window(tmp_path, monkeypatch):
+    paths = [str(tmp_path / f"{i:04d}.csv") for i in range(40)]
+    for i, path in enumerate(paths):
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(pomodoro.CsvExporter.HEADER)
+            writer.writerow([i + 1, "2026-10-18", 25, "読書", "02:12 - 02:37"])
+    importer = pomodoro.CsvImporter(str(tmp_path), workers=2)
+    monkeypatch.setattr(importer, "POOL_MIN_FILES", 1)
+    monkeypatch.setattr(importer, "FILES_PER_TASK", 3)
+    parsed = list(importer.parsed())
+    assert [path for path, _ in parsed] == paths
+    assert [rows[0][0] for _, (rows, _, _) in parsed] == list(range(1, 41))
+
+
+def write_day_csv(export_dir, rows):
+    export_dir.mkdir(exist_ok=True)
+    with open(export_dir / "2026-10-18.csv", "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(pomodoro.CsvExporter.HEADER)
+        writer.writerows(rows)
+
+
+def daily_sessions(store):
+    return store.read(lambda conn: conn.execute("SELECT date, sessions, minutes FROM stats_daily").fetchall()).result()
+
+
+def test_fresh_db_import_reaches_stats(tmp_path):
+    write_day_csv(tmp_path / "exports", [[1, "2026-10-18", 25, "英語の勉強", "02:12 - 02:37"], [2, "2026-10-18", 50, "資料作成", "03:00 - 03:50"]])
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    try:
+        pomodoro.CsvImporter(str(tmp_path / "exports")).run(store)
+        assert daily_sessions(store) == [("2026-10-18", 2, 75)]
+    finally:
+        store.close()
+
+
+def test_pre_rollup_rows_are_counted_once_across_cycles(tmp_path):
+    export_dir = tmp_path / "exports"
+    write_day_csv(export_dir, [[1, "2026-10-18", 25, "英語の勉強", "02:12 - 02:37"], [2, "2026-10-18", 50, "資料作成", "03:00 - 03:50"]])
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    try:
+        # id 1〜9 は集計を入れる前に出力済みだった、という状態にする
+        store.write(lambda conn: conn.execute("UPDATE stats_state SET value = 10 WHERE key IN ('baseline_id', 'counted_ids_from')")).result()
+        for _ in range(3):
+            pomodoro.CsvImporter(str(export_dir)).run(store)
+            assert daily_sessions(store) == [("2026-10-18", 2, 75)]
+            export(store, str(export_dir))
+            assert daily_sessions(store) == [("2026-10-18", 2, 75)]
+        # 集計後に記録した行を出力して取り込み直しても増えない
+        store.insert_log(1792260720, 1792260720 + 1500, 25, "読書").result()
+        export(store, str(export_dir))
+        pomodoro.CsvImporter(str(export_dir)).run(store)
+        assert sum(sessions for _, sessions, _ in daily_sessions(store)) == 3
+    finally:
+        store.close()
@@ -0,0 +1,38 @@
+import csv
+import sqlite3
+
+import pytest
+
+import pomodoro
+
+
+def test_unopenable_db_fails_every_job(tmp_path):
+    store = pomodoro.LogStore(str(tmp_path / "missing" / "work_log.db"))
+    errors = []
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            store.read(lambda conn: conn.execute("SELECT 1").fetchone()).result(timeout=5)
+        future = store.insert_log(0, 1500, 25, "読書")
+        with pytest.raises(sqlite3.OperationalError):
+            future.result(timeout=5)
+        store.read(lambda conn: None, callback=errors.append, errback=errors.append).exception(timeout=5)
+    finally:
+        store.close()
+    assert isinstance(store.error, sqlite3.OperationalError)
+    assert len(errors) == 1 and errors[0] is store.error
+    assert not store.thread.is_alive()
+
+
+def test_failed_migration_does_not_hang_import(tmp_path, monkeypatch):
+    def broken(conn): raise sqlite3.OperationalError("duplicate column name: exported")
+    monkeypatch.setattr(pomodoro.SchemaMigrations, "export_flags", staticmethod(broken))
+    with open(tmp_path / "2026-10-18.csv", "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(pomodoro.CsvExporter.HEADER)
+        writer.writerow([1, "2026-10-18", 25, "読書", "02:12 - 02:37"])
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="duplicate column"):
+            pomodoro.CsvImporter(str(tmp_path)).run(store)
+    finally:
+        store.close()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import pomodoro
+
+
+def per_sample_noise(white, color, vol):
+    """ベースラインの generate_noise_file のループ (random.uniform の代わりに white を使う)"""
+    out = []
+    last_val = 0
+    b = [0.0] * 7
+    for w in white:
+        w = float(w)
+        if color == "brown":
+            last_val = (last_val + (0.02 * w)) / 1.02
+            val = last_val * vol * 30
+        else:
+            b[0] = 0.99886 * b[0] + w * 0.0555179
+            b[1] = 0.99332 * b[1] + w * 0.0750759
+            b[2] = 0.96900 * b[2] + w * 0.1538520
+            b[3] = 0.86650 * b[3] + w * 0.3104856
+            b[4] = 0.55000 * b[4] + w * 0.5329522
+            b[5] = -0.7616 * b[5] - w * 0.0168980
+            val = (sum(b) + b[6] + w * 0.5362) * 0.11 * vol * 5
+            b[6] = w * 0.115926
+        out.append(max(-32000, min(32000, int(val))))
+    return np.array(out)
+
+
+def psd_slope(pcm, rate=pomodoro.NOISE_SAMPLE_RATE, segment=4096):
+    """Welch 法のPSDを 50Hz〜5kHz で log-log 直線近似した傾き"""
+    segments = pcm[:len(pcm) // segment * segment].astype(float).reshape(-1, segment) * np.hanning(segment)
+    psd = (np.abs(np.fft.rfft(segments, axis=1)) ** 2).mean(axis=0)
+    freqs = np.fft.rfftfreq(segment, 1 / rate)
+    band = (freqs >= 50) & (freqs <= 5000)
+    return np.polyfit(np.log10(freqs[band]), np.log10(psd[band]), 1)[0]
+
+
+@pytest.mark.parametrize("color", ["pink", "brown"])
+def test_matches_per_sample_implementation(color):
+    nframes = 3 * pomodoro.NOISE_SAMPLE_RATE
+    synth = pomodoro.NoiseSynth(color, seed=1)
+    # チャンク境界がブロック (256) の倍数にならない大きさで切る
+    pcm = np.concatenate(list(synth.chunks(nframes, chunk=10_007)))
+    white = np.random.default_rng(1).uniform(-1, 1, nframes)
+    reference = per_sample_noise(white, color, synth.amplitude)
+    assert np.array_equal(pcm, reference)
+    assert psd_slope(pcm) == pytest.approx(psd_slope(reference), abs=0.05)
+
+
+def test_psd_slopes():
+    slopes = {color: psd_slope(pomodoro.NoiseSynth(color, seed=2).render(5)) for color in ("white", "pink", "brown")}
+    assert slopes["white"] == pytest.approx(0, abs=0.1)
+    assert slopes["pink"] == pytest.approx(-1, abs=0.25)
+    assert slopes["brown"] == pytest.approx(-2, abs=0.3)
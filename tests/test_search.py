@@ -0,0 +1,102 @@
+import types
+
+import pytest
+
+import pomodoro
+
+
+def add(conn, *names):
+    start = 1792260720
+    for i, name in enumerate(names):
+        ts = start + i * 1800
+        date, time_range = pomodoro.log_period(ts, ts + 1500)
+        conn.execute("INSERT INTO logs (start_ts, end_ts, duration_minutes, task_name, date, time_range) VALUES (?, ?, 25, ?, ?, ?)",
+                     (ts, ts + 1500, name, date, time_range))
+        pomodoro.StatsRollup.add(conn, date, 25, name)
+
+
+def names(rows):
+    return [row[4] for row in rows]
+
+
+def test_fts_results_are_ranked_by_bm25(conn):
+    if pomodoro.TaskSearch.tokenizer(conn) != "trigram": pytest.skip("trigram tokenizer not available")
+    add(conn, "英語の勉強", "英語の勉強と数学の勉強の復習", "英語の勉強", "資料作成")
+    count, max_id = pomodoro.TaskSearch.count(conn, "の勉強")
+    assert count == 3
+    rows = pomodoro.TaskSearch.page(conn, "の勉強", max_id + 1, 0, 10)
+    assert [row[0] for row in rows] == [3, 1, 2]
+    assert [row[0] for row in pomodoro.TaskSearch.page(conn, "の勉強", max_id + 1, 1, 1)] == [1]
+
+
+def test_fallback_uses_subquery_and_shorter_names_first(conn):
+    add(conn, "数学の勉強", "英語", "英語の勉強", "100%_done", "英語")
+    count, max_id = pomodoro.TaskSearch.count(conn, "英語")
+    assert count == 3
+    assert names(pomodoro.TaskSearch.page(conn, "英語", max_id + 1, 0, 10)) == ["英語", "英語", "英語の勉強"]
+    # LIKE の特殊文字はそのままの文字として探す
+    assert pomodoro.TaskSearch.count(conn, "%_")[0] == 1
+    assert pomodoro.TaskSearch.count(conn, "_")[0] == 1
+    where, params = pomodoro.TaskSearch.name_filter("英語 の")
+    assert len(params) == 2 and "SELECT" in where
+
+
+def test_unranked_model_pages_from_the_top():
+    calls = []
+    model = pomodoro.HistoryModel(lambda before_id, offset, limit, callback: calls.append((before_id, offset)) or callback([(9,)] * limit),
+                                  lambda callback: callback((1000, 500)), page_size=10, keyset=False)
+    model.reset()
+    model.row(0)
+    model.row(35)
+    assert calls == [(501, 0), (501, 30)]
+
+
+class FakeEntry:
+    """Tk の Entry のうち補完で使う部分だけ"""
+
+    def __init__(self, text):
+        self.text = text
+        self.cursor = len(text)
+        self.selection = None
+
+    def get(self): return self.text
+    def index(self, where): return len(self.text) if where == "end" else self.cursor
+    def selection_present(self): return self.selection is not None
+    def insert(self, where, s):
+        pos = self.index(where)
+        self.text = self.text[:pos] + s + self.text[pos:]
+    def select_range(self, start, end): self.selection = (start, self.index(end))
+    def icursor(self, pos): self.cursor = pos
+
+
+def completing_app(text):
+    completer = pomodoro.TaskCompleter()
+    completer.load([("英語の勉強", 5), ("英作文", 1)])
+    entry = FakeEntry(text)
+    app = types.SimpleNamespace(task_entry=types.SimpleNamespace(_entry=entry), task_completer=completer, ime_composing=False)
+    return app, entry
+
+
+def test_completion_selects_only_the_suffix():
+    app, entry = completing_app("英語")
+    pomodoro.PomodoroApp.complete_task_entry(app)
+    assert (entry.text, entry.selection, entry.cursor) == ("英語の勉強", (2, 5), 2)
+
+
+def test_no_completion_mid_text_or_while_composing():
+    app, entry = completing_app("英語")
+    entry.cursor = 1
+    pomodoro.PomodoroApp.complete_task_entry(app)
+    assert entry.text == "英語"
+    app, entry = completing_app("英語")
+    app.ime_composing = True
+    pomodoro.PomodoroApp.complete_task_entry(app)
+    assert entry.text == "英語"
+
+
+def test_key_handler_ignores_ime_and_control_keys():
+    scheduled = []
+    app = types.SimpleNamespace(ime_composing=False, IME_PROCESS_KEYCODE=229, after_idle=scheduled.append, complete_task_entry="complete")
+    for char, keycode in [("", 16), ("\b", 8), ("a", 229), ("a", 65)]:
+        pomodoro.PomodoroApp.on_entry_key(app, types.SimpleNamespace(char=char, keycode=keycode))
+    assert scheduled == ["complete"]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+import pomodoro
+
+
+async def post(port, path, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+@pytest.mark.parametrize("minutes", [-5, 0, 0.01, 25.0, "25", True, pomodoro.TimerService.MAX_MINUTES + 1])
+def test_invalid_minutes_are_rejected(minutes, clock):
+    service = pomodoro.TimerService(clock=clock)
+    with pytest.raises(ValueError):
+        service.start("alice", minutes)
+    with pytest.raises(ValueError):
+        service.reset("alice", minutes)
+    assert service.timers == {}
+
+
+def test_valid_minutes(clock):
+    service = pomodoro.TimerService(clock=clock)
+    assert service.start("alice", 50)["duration"] == 50 * 60
+    assert service.reset("alice")["duration"] == 50 * 60
+    assert service.reset("alice", pomodoro.TimerService.MAX_MINUTES)["minutes"] == pomodoro.TimerService.MAX_MINUTES
+    assert service.start("bob")["minutes"] == 25
+
+
+def test_http_returns_400_for_bad_minutes(clock):
+    service = pomodoro.TimerService(clock=clock)
+
+    async def main():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return [await post(port, "/timers/alice/start", {"minutes": -5}),
+                    await post(port, "/timers/alice/reset", {"minutes": 0.01}),
+                    await post(port, "/timers/alice/start", {"minutes": 5})]
+
+    (bad_start, _), (bad_reset, _), (ok, status) = asyncio.run(main())
+    assert (bad_start, bad_reset, ok) == (400, 400, 200)
+    assert status["duration"] == 5 * 60
+    assert not service.pending_logs
+
+
+def test_logged_advances_after_the_session_is_written(tmp_path, clock):
+    store = pomodoro.LogStore(str(tmp_path / "work_log.db"))
+    service = pomodoro.TimerService(store, clock=clock)
+
+    async def main():
+        runner = asyncio.ensure_future(service.run())
+        await asyncio.sleep(0)
+        assert service.start("alice", 1, "focus", "読書")["logged"] == 0
+        clock.now += 61
+        service.wakeup.set()
+        for _ in range(500):
+            if service.get("alice").logged: break
+            await asyncio.sleep(0.01)
+        runner.cancel()
+        return service.get("alice").status()
+
+    try:
+        status = asyncio.run(main())
+        rows = store.read(lambda conn: conn.execute("SELECT duration_minutes, task_name FROM logs").fetchall()).result()
+    finally:
+        store.close()
+    assert status["logged"] == 1
+    assert rows == [(1, "読書")]
+
+
+class RemoteApp:
+    """PomodoroApp のうちサービス連携の部分だけを動かす代用品"""
+    change_mode = pomodoro.PomodoroApp.change_mode
+    reset_timer = pomodoro.PomodoroApp.reset_timer
+    pause_timer = pomodoro.PomodoroApp.pause_timer
+    wait_remote_log = pomodoro.PomodoroApp.wait_remote_log
+    REMOTE_LOG_POLL_MS = pomodoro.PomodoroApp.REMOTE_LOG_POLL_MS
+
+    def __init__(self, statuses=()):
+        self.sent = []
+        self.statuses = list(statuses)
+        self.scheduled = []
+        self.history_loads = 0
+        self.timer_running = True
+        self.selected_duration = 25 * 60
+        self.engine = pomodoro.TimerEngine(self.selected_duration)
+        self.status_label = types.SimpleNamespace(configure=lambda **kwargs: None)
+        self.service = types.SimpleNamespace(status=lambda callback: callback(self.statuses.pop(0)))
+
+    def remote(self, action, **payload): self.sent.append((action, payload))
+    def call_in_ui(self, func, *args): func(*args)
+    def after(self, ms, func): self.scheduled.append(func)
+    def load_history(self): self.history_loads += 1
+    def update_time_display(self): pass
+    def set_start_state(self, text, color): pass
+    def pause_bgm(self): pass
+    def stop_bgm(self): pass
+
+
+def test_change_mode_sends_a_single_reset():
+    app = RemoteApp()
+    app.change_mode("Focus 50")
+    assert [sent for sent in app.sent if sent[0] == "reset"] == [("reset", {"minutes": 50})]
+    assert app.engine.duration == 50 * 60 and app.timer_seconds == 50 * 60
+
+
+def test_history_reloads_once_the_service_has_logged():
+    app = RemoteApp([{"logged": 3}, {"logged": 3}, {"logged": 4}])
+    app.wait_remote_log(3)
+    while app.scheduled and not app.history_loads: app.scheduled.pop(0)()
+    assert app.history_loads == 1 and not app.statuses and app.remote_logged == 4
@@ -0,0 +1,20 @@
+import pomodoro
+
+
+def test_add_accumulates_per_day_week_and_task(conn):
+    pomodoro.StatsRollup.add(conn, "2026-10-18", 25, "英語の勉強")
+    pomodoro.StatsRollup.add(conn, "2026-10-18", 50, "英語の勉強")
+    pomodoro.StatsRollup.add(conn, "2026-10-12", 25, "資料作成", sessions=2)
+    assert conn.execute("SELECT date, sessions, minutes FROM stats_daily ORDER BY date").fetchall() == [("2026-10-12", 2, 25), ("2026-10-18", 2, 75)]
+    assert conn.execute("SELECT week, sessions, minutes FROM stats_weekly").fetchall() == [("2026-W42", 4, 100)]
+    assert conn.execute("SELECT task_name, sessions, minutes FROM stats_task_daily WHERE date = '2026-10-18'").fetchall() == [("英語の勉強", 2, 75)]
+
+
+def test_upserts_name_their_conflict_target(conn):
+    """衝突対象を省いた ON CONFLICT は SQLite 3.35 未満で構文エラーになる"""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    pomodoro.StatsRollup.add(conn, "2026-10-18", 25, "読書")
+    upserts = [s for s in statements if "ON CONFLICT" in s]
+    assert len(upserts) == 3
+    assert all("ON CONFLICT(" in s for s in upserts)
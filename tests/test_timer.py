@@ -0,0 +1,37 @@
+import math
+import random
+
+import pomodoro
+
+
+def test_late_ticks_do_not_accumulate_drift(clock):
+    """50分のセッションで after() が毎回最大 50ms 遅れても、締切は開始時刻 + 長さから動かない"""
+    rng = random.Random(0)
+    duration = 50 * 60
+    clock.now = started = 1234.5
+    engine = pomodoro.TimerEngine(duration, clock=clock)
+    engine.start()
+    ticks = 0
+    while not engine.finished():
+        clock.now += math.ceil(engine.next_boundary() * 1000) / 1000 + rng.uniform(0, 0.05)
+        ticks += 1
+        # ずれの蓄積はゼロ: 何回 tick しても締切は同じで、残り時間は締切と今の時刻だけで決まる
+        assert engine.deadline == started + duration
+        assert engine.remaining() == max(0.0, started + duration - clock.now)
+        # 表示 (切り上げ) は本当の残り時間から1秒以上ずれない
+        assert 0 <= engine.remaining_display() - (started + duration - clock.now) < 1
+    assert ticks == duration
+    # 終了の遅れは最後の1回の遅れだけ (3000 回分の遅れは積み上がらない)
+    assert (clock.now - (started + duration)) * 1000 < 51
+
+
+def test_pause_keeps_remaining_time(clock):
+    engine = pomodoro.TimerEngine(60, clock=clock)
+    engine.start()
+    clock.now = 10.25
+    engine.pause()
+    clock.now = 500
+    assert engine.remaining() == 49.75
+    engine.start()
+    clock.now = 500 + 49.75
+    assert engine.finished()